@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class BatterySystem:
     def __init__(self, capacity, max_charge_rate, max_discharge_rate, min_battery_level=0.2, efficiency=0.95):
         self.capacity = capacity  # kWh
@@ -6,3 +9,21 @@ class BatterySystem:
         self.max_discharge_rate = max_discharge_rate  # kW
         self.efficiency = efficiency  # Battery round-trip efficiency
         self.soc = 0.5 * capacity  # Initialize at 50% capacity
+
+    def apply(self, battery_actions, dt=1.0):
+        """
+        Apply battery actions held for dt hours each to the state of charge.
+
+        Returns:
+            np.ndarray: SOC at the start of each step
+        """
+        socs = np.zeros(len(battery_actions))
+        for i, battery_action in enumerate(battery_actions):
+            socs[i] = self.soc
+            if battery_action > 0:  # Charging
+                self.soc += battery_action * self.efficiency * dt
+            else:  # Discharging
+                self.soc += battery_action / self.efficiency * dt
+
+            self.soc = np.clip(self.soc, 0, self.capacity)
+        return socs
@@ -0,0 +1,178 @@
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+import numpy as np
+import scipy
+import pandas as pd
+from smart_grid_mpc import SmartGridMPC
+from solar_simulator import SolarProductionSimulator
+from consumption_simulator import ConsumptionSimulator
+from simulation import load_inputs, make_battery, run_simulation, production_adjust
+from config import Config
+
+
+def _timings(fn, repeats):
+    fn()  # Warm up, so that imports and one-time setup are not timed
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'median': float(np.median(times)), 'min': float(np.min(times)), 'repeats': repeats}
+
+
+def _controller(cfg, horizon, solver, **kwargs):
+    return SmartGridMPC(make_battery(cfg.n_battery, cfg), ampacity=cfg.ampacity, horizon=horizon, solver=solver,
+                        use_battery=True, **kwargs)
+
+
+def bench_solve(inputs, cfg, horizons, solvers, repeats, n_windows):
+    """Latency of single MPC solves: a new controller per solve (cold) and one controller reused (repeated)."""
+    adjust = production_adjust(cfg.mode)
+    rows = []
+    for solver in solvers:
+        for horizon in horizons:
+            # Windows spread over the year, so the benchmark covers both summer and winter problems
+            starts = np.linspace(0, len(inputs['times']) - horizon, n_windows).astype(int)
+            windows = [(inputs['buy_prices'][t:t + horizon], inputs['sell_prices'][t:t + horizon],
+                        inputs['solar_production'][t:t + horizon] * adjust, inputs['consumption'][t:t + horizon])
+                       for t in starts]
+
+            def cold():
+                for window in windows:
+                    _controller(cfg, horizon, solver).optimize(*window)
+
+            controller = _controller(cfg, horizon, solver, warm_start=True, delta_hour=24)
+
+            def repeated():
+                for window in windows:
+                    controller.optimize(*window)
+
+            for mode, fn in (('cold', cold), ('repeated', repeated)):
+                timing = _timings(fn, repeats)
+                rows.append({'benchmark': 'solve', 'solver': solver, 'horizon': horizon, 'mode': mode,
+                             'seconds_per_solve': timing['median'] / len(windows),
+                             'min_seconds_per_solve': timing['min'] / len(windows), 'repeats': repeats})
+                print(f"solve {solver:8s} horizon={horizon:4d} {mode:8s} "
+                      f"{rows[-1]['seconds_per_solve'] * 1000:9.2f} ms")
+    return rows
+
+
+def bench_load(cfg, repeats):
+    """Load time of the profile simulators, parsing the CSVs and from the profile cache."""
+    rows = []
+    for name, cls in (('solar', SolarProductionSimulator), ('consumption', ConsumptionSimulator)):
+        for use_cache in (False, True):
+            cls(use_cache=use_cache)  # warm the cache and the file system
+            timing = _timings(lambda: cls(use_cache=use_cache), repeats)
+            rows.append({'benchmark': 'load', 'simulator': name, 'cached': use_cache, 'seconds': timing['median'],
+                         'repeats': repeats})
+            print(f"load {name:12s} cached={use_cache!s:5s} {timing['median'] * 1000:9.2f} ms")
+
+    n_hour_pad = cfg.n_hour + cfg.horizon
+    timing = _timings(lambda: load_inputs(n_hour_pad), repeats)
+    rows.append({'benchmark': 'load', 'simulator': 'inputs', 'cached': True, 'seconds': timing['median'],
+                 'repeats': repeats})
+    print(f"load {'inputs':12s} {n_hour_pad} hours {timing['median'] * 1000:9.2f} ms")
+    return rows
+
+
+def bench_simulation(inputs, cfg, delta_hours, solvers, repeats):
+    """End-to-end simulation throughput in simulated hours per second."""
+    rows = []
+    n_hour = cfg.n_hour
+    for solver in solvers:
+        for delta_hour in delta_hours:
+            def simulate():
+                run_simulation(inputs, cfg, delta_hour=delta_hour, verbose=False, solver=solver)
+
+            timing = _timings(simulate, repeats)
+            rows.append({'benchmark': 'simulation', 'solver': solver, 'delta_hour': delta_hour, 'n_hour': n_hour,
+                         'seconds': timing['median'], 'hours_per_second': n_hour / timing['median'],
+                         'repeats': repeats})
+            print(f"simulation {solver:8s} delta_hour={delta_hour:2d} {n_hour} hours "
+                  f"{timing['median']:8.2f} s {rows[-1]['hours_per_second']:10.0f} hours/s")
+    return rows
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(current, baseline_path):
+    """Print the ratio of each benchmark against a previous result file (> 1 means slower now)."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    metric = {'solve': 'seconds_per_solve', 'load': 'seconds', 'simulation': 'seconds'}
+    key_fields = ('benchmark', 'solver', 'horizon', 'mode', 'simulator', 'cached', 'delta_hour', 'n_hour')
+
+    def key(row):
+        return tuple(row.get(field) for field in key_fields)
+
+    previous = {key(row): row for row in baseline['results']}
+    print(f"\nCompared to {baseline['environment'].get('commit')}:")
+    for row in current['results']:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        name = metric[row['benchmark']]
+        label = ' '.join(str(value) for value in key(row) if value is not None)
+        print(f'{label:50s} {row[name] / old[name]:6.2f}x')
+
+
+def main():
+    default = Config()
+    parser = argparse.ArgumentParser(description='Benchmark MPC solve latency and simulation throughput.')
+    parser.add_argument('--horizons', nargs='+', type=int, default=[24, 48, 96, 168])
+    parser.add_argument('--solvers', nargs='+', default=['linprog', 'slsqp'], choices=SmartGridMPC.solvers)
+    parser.add_argument('--windows', type=int, default=10, help='forecast windows per solve benchmark')
+    parser.add_argument('--n-day', type=int, default=default.n_day, help='days of the simulation benchmark')
+    parser.add_argument('--delta-hours', nargs='+', type=int, default=[24, 1])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='small problem sizes for a fast smoke run')
+    parser.add_argument('--out', default=None, help='result file (default: data/benchmark/<commit>.json)')
+    parser.add_argument('--compare', default=None, help='previous result file to compare against')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.horizons, args.windows, args.n_day, args.repeats = [24, 48], 3, 14, 1
+
+    np.random.seed(1)
+    inputs = load_inputs(default.n_hour + max(args.horizons))
+    results = bench_solve(inputs, default, args.horizons, args.solvers, args.repeats, args.windows)
+    results += bench_load(default, args.repeats)
+    results += bench_simulation(inputs, dataclasses.replace(default, n_day=args.n_day), args.delta_hours, ['linprog'],
+                                args.repeats)
+
+    output = {'environment': environment(), 'results': results}
+    out = args.out or f"data/benchmark/{output['environment']['commit'] or 'latest'}.json"
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'Results written to {out}')
+
+    if args.compare:
+        compare(output, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+
 # mode = 'low_prod'  # total production = 0.9 total consumption
 mode = 'mid_prod'  # total production = total consumption
 # mode = 'high_prod'  # total production = 1.1 total consumption
@@ -8,7 +10,13 @@ consumption_mode = 'base'
 n_day = 366  # number of days to simulate
 n_day_figure = 7  # number of days to plot
 n_hour = n_day * 24
-horizon = 24
+horizon = 24  # hours
+step_minutes = 60  # simulation and control time step, e.g. 15 or 5 for sub-hourly dispatch
+dt = step_minutes / 60  # hours per time step
+
+# Dispatch policy: 'mpc', 'greedy' (self-consumption), 'tou' (time-of-use arbitrage) or 'no_battery'
+policy = 'mpc'
+compare = False  # also simulate every policy and print their cost comparison
 
 # Battery
 use_battery = True  # whether to use battery
@@ -18,7 +26,68 @@ capacity = n_battery * single_capacity  # kWh
 c_rate = 0.5
 min_battery_level = 0.2
 efficiency = 0.95
+degradation_cost = 0.0  # $/kWh of battery throughput (charge + discharge), e.g. 0.02 for cycle wear
+terminal_soc_value = 0.0  # $/kWh of energy left in the battery at the end of the MPC horizon
 
 ampacity = 12  # kW
 
+# Forecast uncertainty of the scenario MPC
+n_scenario = 0  # forecast scenarios, 0 for the deterministic MPC
+solar_forecast_error = 0.2  # relative standard deviation
+consumption_forecast_error = 0.1  # relative standard deviation
+seed = 0  # seed of the forecast scenarios, so that runs are reproducible
+
 tariff = 1  # Grid feed-in tariff
+tariff_file = 'data/tariff/sdge_tou_dr1.json'  # buy and sell rates, see tariff.py
+
+# Results
+output_format = 'csv'  # 'csv', or 'parquet' / 'arrow' (columnar, need the optional pyarrow)
+
+
+@dataclass
+class Config:
+    """
+    Settings of one run, passed explicitly to main.main(), plot_stat.main() and the simulation functions.
+
+    The defaults are the module-level values above, so editing this file still changes the default run. The other
+    modules only read settings from a Config, never from the module-level values.
+    """
+    mode: str = mode
+    consumption_mode: str = consumption_mode
+    n_day: int = n_day
+    n_day_figure: int = n_day_figure
+    horizon: int = horizon  # hours
+    step_minutes: int = step_minutes
+    policy: str = policy
+    compare: bool = compare
+    use_battery: bool = use_battery
+    n_battery: int = n_battery
+    single_capacity: float = single_capacity  # kWh
+    c_rate: float = c_rate
+    min_battery_level: float = min_battery_level
+    efficiency: float = efficiency
+    degradation_cost: float = degradation_cost  # $/kWh of battery throughput
+    terminal_soc_value: float = terminal_soc_value  # $/kWh left in the battery at the end of the horizon
+    ampacity: float = ampacity  # kW
+    n_scenario: int = n_scenario
+    solar_forecast_error: float = solar_forecast_error
+    consumption_forecast_error: float = consumption_forecast_error
+    seed: int = seed
+    tariff_file: str = tariff_file
+    output_format: str = output_format
+
+    def __post_init__(self):
+        if self.step_minutes <= 0 or 60 % self.step_minutes:
+            raise ValueError(f'step_minutes must divide the hour, got {self.step_minutes}')
+
+    @property
+    def n_hour(self):
+        return self.n_day * 24
+
+    @property
+    def dt(self):
+        return self.step_minutes / 60  # hours per time step
+
+    @property
+    def capacity(self):
+        return self.n_battery * self.single_capacity  # kWh
@@ -1,21 +1,37 @@
 # Data source: https://catalog.data.gov/dataset/commercial-and-residential-hourly-load-profiles-for-all-tmy3-locations-in-the-united-state-bbc75
 import numpy as np
 import pandas as pd
+from profile_cache import load_profile, profile_series, profile_table
 
 
 class ConsumptionSimulator:
-    def __init__(self, mode='base'):
+    def __init__(self, mode='base', use_cache=True):
         self.base_load = 0.3  # Base load (always-on appliances)
         self.mode = mode
+        # Consumption indexed by month 1-12, day 1-31 and hour 0-23, valid where the data has the hour
+        self.mdh_consumption, self.mdh_valid = load_profile(self.source(mode), self.load_table, mode=mode,
+                                                            use_cache=use_cache)
+        self._table = None
+
+    @staticmethod
+    def source(mode='base'):
+        return f'data/input/consumption_SD_Montgomery_{mode}.csv'
+
+    def load_table(self):
+        """Parse the consumption CSV into the (month, day, hour) table and its validity mask."""
         df = self.pre_process(mode=self.mode)
-        df[['date', 'time']] = df['Date/Time'].str.split('  ', n=1, expand=True)
-        df[['month', 'day']] = df['date'].str.split('/', expand=True)
-        df[['hour', 'minute', 'second']] = df['time'].str.split(':', expand=True)
-        df['mdh'] = df.apply(lambda r: (int(r['month']), int(r['day']), int(r['hour']) - 1), axis=1)
-        self.mdh_consumption = dict(zip(df['mdh'], df['consumption']))
+        # ' MM/DD  HH:00:00' where HH runs 1-24 for the hour ending at HH
+        mdh = df['Date/Time'].str.extract(r'(\d+)/(\d+)\s+(\d+):').astype(int).values
+        month, day, hour = mdh[:, 0], mdh[:, 1], mdh[:, 2] - 1
+
+        mdh_consumption = np.zeros((13, 32, 24))
+        mdh_valid = np.zeros((13, 32, 24), dtype=bool)
+        mdh_consumption[month, day, hour] = df['consumption'].values
+        mdh_valid[month, day, hour] = True
+        return mdh_consumption, mdh_valid
 
     def pre_process(self, mode='base'):
-        df = pd.read_csv(f'data/input/consumption_SD_Montgomery_{mode}.csv')
+        df = pd.read_csv(self.source(mode))
         vals = ['Electricity:Facility [kW](Hourly)', 'Heating:Electricity [kW](Hourly)',
                 'Cooling:Electricity [kW](Hourly)', 'HVACFan:Fans:Electricity [kW](Hourly)',
                 'General:InteriorLights:Electricity [kW](Hourly)', 'General:ExteriorLights:Electricity [kW](Hourly)',
@@ -29,8 +45,8 @@ class ConsumptionSimulator:
     def simulate(self, month: int, day: int, hour: int) -> float:
         """Simulate home energy consumption based on time of day"""
 
-        if (month, day, hour) in self.mdh_consumption:
-            return self.mdh_consumption[(month, day, hour)]
+        if self.mdh_valid[month, day, hour]:
+            return self.mdh_consumption[month, day, hour]
 
         if month == 2 and day == 29:
             return self.simulate(month, day - 1, hour)
@@ -50,3 +66,28 @@ class ConsumptionSimulator:
         # Night time (23-6): low usage
         else:
             return self.base_load + 0.2
+
+    def _fallback(self, hour):
+        """Time-of-day consumption profile for an array of hours."""
+        return self.base_load + np.select(
+            [(7 <= hour) & (hour <= 9), (17 <= hour) & (hour <= 22), (10 <= hour) & (hour <= 16)],
+            [1.5, 2.0, 0.8],
+            0.2,
+        )
+
+    def _lookup_table(self):
+        """(month, day, hour) table of simulate(), indexed by month 1-12, day 1-31 and hour 0-23."""
+        if self._table is None:
+            self._table = profile_table(self.mdh_consumption, self.mdh_valid, self._fallback)
+        return self._table
+
+    def series(self, times):
+        """
+        Home energy consumption for every timestamp of a DatetimeIndex.
+
+        Timestamps between two hours are linearly interpolated between the hourly values.
+
+        Returns:
+            np.ndarray: same values as simulate() for timestamps on the hour
+        """
+        return profile_series(self._lookup_table(), times)
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import copy
+import dataclasses
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from simulation import make_battery, production_adjust
+from smart_grid_mpc import SmartGridMPC
+from config import Config
+
+
+class ReplaySource:
+    """
+    Mock inverter/meter feed that replays the bundled solar and consumption profiles as live measurements.
+
+    One measurement is yielded every interval seconds of wall time for every dt hours of profile time. With
+    solar_noise or consumption_noise, the readings deviate from the profiles (which the forecaster uses) by a
+    relative Gaussian error.
+    """
+
+    def __init__(self, start='2024-01-01', n_hour=None, interval=1.0, dt=1.0, mode='mid_prod', consumption_mode='base',
+                 solar_noise=0.0, consumption_noise=0.0, seed=None):
+        self.start = start
+        self.n_hour = n_hour
+        self.interval = interval  # seconds between two measurements
+        self.dt = dt  # hours of profile time between two measurements
+        self.mode = mode
+        self.consumption_mode = consumption_mode
+        self.solar_noise = solar_noise
+        self.consumption_noise = consumption_noise
+        self.rng = np.random.default_rng(seed)
+
+    async def __aiter__(self):
+        from simulation_engine import stream_inputs
+
+        stream = stream_inputs(self.start, self.n_hour, mode=self.mode, consumption_mode=self.consumption_mode,
+                               dt=self.dt)
+        for inputs in stream:
+            noise = self.rng.standard_normal(2)
+            yield {
+                'time': inputs['time'],
+                'solar_production': max(inputs['solar_production'] * (1 + self.solar_noise * noise[0]), 0.0),
+                'consumption': max(inputs['consumption'] * (1 + self.consumption_noise * noise[1]), 0.0),
+            }
+            await asyncio.sleep(self.interval)
+
+
+class CSVReplaySource:
+    """Replays the time, solar_production and consumption columns of a results or measurement CSV file."""
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+
+    async def __aiter__(self):
+        readings = pd.read_csv(self.path, usecols=['time', 'solar_production', 'consumption'], parse_dates=['time'])
+        for reading in readings.itertuples(index=False):
+            yield {'time': reading.time, 'solar_production': reading.solar_production,
+                   'consumption': reading.consumption}
+            await asyncio.sleep(self.interval)
+
+
+class SocketSource:
+    """Reads measurements as JSON lines from a TCP socket, e.g. the one opened by serve()."""
+
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.host = host
+        self.port = port
+
+    async def __aiter__(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while line := await reader.readline():
+                measurement = json.loads(line)
+                measurement['time'] = pd.Timestamp(measurement['time'])
+                yield measurement
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+
+async def serve(source, host='127.0.0.1', port=8765):
+    """Publish the measurements of a source as JSON lines to every client that connects to host:port."""
+
+    async def handle(reader, writer):
+        async for measurement in source:
+            writer.write((json.dumps({**measurement, 'time': str(measurement['time'])}) + '\n').encode())
+            await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+class ProfileForecaster:
+    """Forecasts prices from the tariff and solar production and consumption from the bundled profiles."""
+
+    def __init__(self, dt=1.0, mode='mid_prod', consumption_mode='base', tariff_file=None):
+        from price_forecast import PriceForecast
+        from solar_simulator import SolarProductionSimulator
+        from consumption_simulator import ConsumptionSimulator
+
+        self.dt = dt
+        self.price_forecast = PriceForecast(tariff_file)
+        self.solar_simulator = SolarProductionSimulator()
+        self.consumption_simulator = ConsumptionSimulator(mode=consumption_mode)
+        self.adjust = production_adjust(mode)
+
+    def forecast(self, measurement, horizon):
+        """
+        Forecast the horizon starting at the time of a measurement, whose readings replace the first step.
+
+        Returns:
+            Tuple of (buy_prices, sell_prices, solar_production, consumption)
+        """
+        times = pd.date_range(measurement['time'], periods=horizon, freq=pd.Timedelta(hours=self.dt))
+        buy_prices, sell_prices = self.price_forecast.series(times)
+        solar_production = self.solar_simulator.series(times) * self.adjust
+        consumption = self.consumption_simulator.series(times)
+        solar_production[0] = measurement['solar_production']
+        consumption[0] = measurement['consumption']
+        return buy_prices, sell_prices, solar_production, consumption
+
+
+class ControlService:
+    """
+    Live receding-horizon control loop around SmartGridMPC.
+
+    Measurements are ingested from an async source into a queue by their own task, so that intake never waits on
+    the controller. Every replan_steps measurements the controller forecasts and re-plans in an executor thread,
+    off the event loop. A setpoint is published for every measurement within latency_budget seconds, its origin is
+    'plan' when the solve finishes in time, 'schedule' between two solves, 'last_plan' when the solve falls back to
+    the last plan and 'idle' without any plan. A solve that misses its deadline keeps running and its plan is used
+    once it finishes. A solve that fails also falls back to the last plan, its error is recorded in the setpoint.
+
+    The battery is simulated from the published setpoints, standing in for the SOC reading of a real inverter.
+    """
+
+    def __init__(self, controller, battery, source, forecaster, publish=None, replan_steps=1, latency_budget=0.5,
+                 executor=None, queue_size=1024, history_size=10000):
+        self.controller = controller
+        self.battery = battery
+        self.source = source
+        self.forecaster = forecaster
+        self.publish = publish  # callable or coroutine function called with every setpoint
+        self.replan_steps = replan_steps
+        self.latency_budget = latency_budget  # seconds from measurement intake to setpoint
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+        self.setpoints = deque(maxlen=history_size)  # the last history_size published setpoints
+        # Running totals of all published setpoints, which the bounded history may no longer hold
+        self._totals = {'setpoints': 0, 'deadline_misses': 0, 'fallbacks': 0, 'errors': 0, 'max_latency': 0.0,
+                        'within_budget': 0}
+        self._plan = None  # battery actions from the plan start on
+        self._plan_step = 0  # step of the first planned action
+        self._pending = None  # solve that missed its deadline and still runs
+        self._late_error = None  # error of a solve that failed after its deadline, reported with the next setpoint
+        self._step = 0
+
+    async def _ingest(self):
+        async for measurement in self.source:
+            measurement['received'] = time.perf_counter()
+            await self.queue.put(measurement)
+        await self.queue.put(None)
+
+    def _solve(self, soc, measurement):
+        # The controller plans on its own battery copy, so that a late solve never sees SOC updates of the loop
+        self.controller.battery.soc = soc
+        forecast = self.forecaster.forecast(measurement, self.controller.horizon)
+        battery_actions, _ = self.controller.optimize(*forecast)
+        return battery_actions
+
+    def _on_solved(self, future, step):
+        # Runs on the event loop once a solve finishes, also when it missed its deadline
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if future is self._pending:
+                self._late_error = future.exception()
+            return
+        self._plan = future.result()
+        self._plan_step = step
+
+    async def _replan(self, measurement):
+        """
+        Start a solve and wait for it within the remaining latency budget.
+
+        Returns:
+            Tuple of (fallback, error). fallback is None when the new plan is in place, otherwise the reason of the
+            fallback to the last plan: 'pending' (the previous solve still runs), 'deadline' or 'error'
+        """
+        if self._pending is not None:
+            if not self._pending.done():
+                return 'pending', None  # The previous solve is still running, keep the last plan
+            self._pending = None
+
+        loop = asyncio.get_running_loop()
+        step = self._step
+        future = loop.run_in_executor(self.executor, self._solve, self.battery.soc, measurement)
+        future.add_done_callback(lambda done: self._on_solved(done, step))
+
+        remaining = self.latency_budget - (time.perf_counter() - measurement['received'])
+        try:
+            self._plan = await asyncio.wait_for(asyncio.shield(future), timeout=max(remaining, 0))
+            self._plan_step = step
+            return None, None
+        except asyncio.TimeoutError:
+            self._pending = future
+            return 'deadline', None
+        except Exception as error:  # A failed solve must not stop the control loop
+            return 'error', error
+
+    async def _control(self):
+        while (measurement := await self.queue.get()) is not None:
+            fallback, error = None, None
+            origin = 'schedule'  # Steps between two solves follow the current plan
+            if self._step % self.replan_steps == 0:
+                fallback, error = await self._replan(measurement)
+                origin = 'plan' if fallback is None else 'last_plan'
+            if error is None and self._late_error is not None:
+                error, self._late_error = self._late_error, None
+
+            offset = self._step - self._plan_step
+            if self._plan is not None and offset < len(self._plan):
+                battery_action = float(self._plan[offset])
+            else:
+                battery_action = 0.0
+                origin = 'idle'
+
+            soc = self.battery.apply([battery_action], dt=self.controller.dt)[0]
+            # The grid meets the remaining demand, as in the simulation
+            grid_action = measurement['consumption'] + battery_action - measurement['solar_production']
+            setpoint = {
+                'time': measurement['time'],
+                'battery_action': battery_action,
+                'grid_action': grid_action,
+                'battery_soc': soc,
+                'origin': origin,
+                'fallback': fallback,
+                'deadline_missed': fallback in ('deadline', 'pending'),
+                'error': None if error is None else repr(error),
+                'latency': time.perf_counter() - measurement['received'],
+            }
+            self.setpoints.append(setpoint)
+            self._count(setpoint)
+            if self.publish is not None:
+                published = self.publish(setpoint)
+                if asyncio.iscoroutine(published):
+                    await published
+            self._step += 1
+
+    def _count(self, setpoint):
+        totals = self._totals
+        totals['setpoints'] += 1
+        totals['deadline_misses'] += setpoint['deadline_missed']
+        totals['fallbacks'] += setpoint['fallback'] is not None
+        totals['errors'] += setpoint['error'] is not None
+        totals['max_latency'] = max(totals['max_latency'], setpoint['latency'])
+        totals['within_budget'] += setpoint['latency'] <= self.latency_budget
+
+    def _warm_up(self):
+        # The first solve imports and sets up the solver, which would miss the latency budget
+        zeros = np.zeros(self.controller.horizon)
+        self.controller.optimize(zeros, zeros, zeros, zeros)
+
+    async def run(self):
+        """Warm up the controller and run until the source is exhausted. Returns the kept setpoints."""
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._warm_up)
+        ingest = asyncio.create_task(self._ingest())
+        try:
+            await self._control()
+        finally:
+            ingest.cancel()
+        return self.setpoints
+
+    def latency_summary(self):
+        """Decision latency statistics of all published setpoints, the percentiles are of the kept setpoints."""
+        totals = self._totals
+        if not totals['setpoints']:
+            return {'setpoints': 0}
+        latency = np.array([setpoint['latency'] for setpoint in self.setpoints])
+        return {
+            'setpoints': totals['setpoints'],
+            'deadline_misses': totals['deadline_misses'],
+            'fallbacks': totals['fallbacks'],
+            'errors': totals['errors'],
+            'p50_latency': float(np.percentile(latency, 50)),
+            'p95_latency': float(np.percentile(latency, 95)),
+            'max_latency': totals['max_latency'],
+            'within_budget': totals['within_budget'] / totals['setpoints'],
+        }
+
+
+def main():
+    default = Config()
+    parser = argparse.ArgumentParser(description='Run the MPC as a live control loop on a replayed meter feed.')
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--n-hour', type=int, default=48, help='hours of profiles to replay')
+    parser.add_argument('--interval', type=float, default=0.05, help='seconds between two measurements')
+    parser.add_argument('--step-minutes', type=int, default=default.step_minutes)
+    parser.add_argument('--replan-steps', type=int, default=1, help='measurements between two solves')
+    parser.add_argument('--latency-budget', type=float, default=0.2, help='seconds from measurement to setpoint')
+    parser.add_argument('--solver', default='linprog', choices=SmartGridMPC.solvers)
+    parser.add_argument('--noise', type=float, default=0.1, help='relative error of the readings')
+    parser.add_argument('--csv', default=None, help='replay this CSV instead of the bundled profiles')
+    parser.add_argument('--port', type=int, default=None, help='replay over a local TCP socket on this port')
+    args = parser.parse_args()
+
+    cfg = dataclasses.replace(default, step_minutes=args.step_minutes)
+    dt = cfg.dt
+    battery = make_battery(cfg.n_battery, cfg)
+    controller = SmartGridMPC(copy.copy(battery), ampacity=cfg.ampacity, horizon=int(round(cfg.horizon / dt)),
+                              solver=args.solver, warm_start=True, delta_hour=args.replan_steps,
+                              use_battery=cfg.use_battery, dt=dt, degradation_cost=cfg.degradation_cost,
+                              terminal_soc_value=cfg.terminal_soc_value)
+    if args.csv is not None:
+        source = CSVReplaySource(args.csv, interval=args.interval)
+    else:
+        source = ReplaySource(args.start, args.n_hour, interval=args.interval, dt=dt, mode=cfg.mode,
+                              consumption_mode=cfg.consumption_mode, solar_noise=args.noise,
+                              consumption_noise=args.noise, seed=1)
+
+    def publish(setpoint):
+        if setpoint['time'].hour % 6 == 0 and setpoint['time'].minute == 0:
+            print(f"{setpoint['time']} battery {setpoint['battery_action']:6.2f} kW grid {setpoint['grid_action']:6.2f}"
+                  f" kW SOC {setpoint['battery_soc']:5.2f} kWh {setpoint['origin']:9s} "
+                  f"{setpoint['latency'] * 1000:6.1f} ms")
+
+    async def run():
+        service_source = source
+        server = None
+        if args.port is not None:
+            server = await serve(source, port=args.port)
+            service_source = SocketSource(port=args.port)
+        forecaster = ProfileForecaster(dt=dt, mode=cfg.mode, consumption_mode=cfg.consumption_mode,
+                                       tariff_file=cfg.tariff_file)
+        service = ControlService(controller, battery, service_source, forecaster, publish=publish,
+                                 replan_steps=args.replan_steps, latency_budget=args.latency_budget)
+        await service.run()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        return service
+
+    service = asyncio.run(run())
+    print('\nLatency Summary:')
+    for key, value in service.latency_summary().items():
+        print(f'{key}: {value}')
+
+
+if __name__ == '__main__':
+    main()
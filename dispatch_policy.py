@@ -0,0 +1,197 @@
+import dataclasses
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+from result_recorder import ResultRecorder
+from simulation import make_battery, production_adjust, run_simulation
+from config import Config
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the plain Python loop takes a few milliseconds per simulated year
+    def njit(fn):
+        return fn
+
+
+@njit
+def _dispatch(targets, soc, safe_level, capacity, max_charge_rate, max_discharge_rate, efficiency, dt):
+    """
+    Follow target battery actions as closely as the rate and SOC limits allow.
+
+    Returns:
+        Tuple of (battery_actions, battery_socs), the SOC at the start of each step
+    """
+    n = len(targets)
+    battery_actions = np.zeros(n)
+    battery_socs = np.zeros(n)
+    for t in range(n):
+        battery_socs[t] = soc
+        action = targets[t]
+        if action > 0:  # Charging
+            action = min(action, max_charge_rate, max(capacity - soc, 0.0) / (efficiency * dt))
+            soc += action * efficiency * dt
+        else:  # Discharging
+            action = max(action, -max_discharge_rate, -max(soc - safe_level, 0.0) * efficiency / dt)
+            soc += action / efficiency * dt
+        battery_actions[t] = action
+    return battery_actions, battery_socs
+
+
+class DispatchPolicy(ABC):
+    """
+    Interface of the dispatch policies that main.py can switch between.
+
+    run() simulates a policy on precomputed inputs (see simulation.load_inputs) with the settings of cfg (default
+    Config()) and overrides of its fields, like run_simulation, and returns the results DataFrame in its layout.
+    """
+    name = None
+
+    @abstractmethod
+    def run(self, inputs, cfg=None, n_hour=None, **overrides):
+        pass
+
+
+class RuleBasedPolicy(DispatchPolicy):
+    """
+    Rule-based policies only implement targets(), the battery actions they aim for over the whole simulation,
+    which are then clipped to the battery limits in one compiled or plain loop.
+    """
+
+    def run(self, inputs, cfg=None, n_hour=None, **overrides):
+        cfg = dataclasses.replace(cfg or Config(), **overrides)
+        dt = inputs['dt']
+        n_step = int(round((cfg.n_hour if n_hour is None else n_hour) / dt))
+        battery = make_battery(cfg.n_battery, cfg)
+        buy_prices = inputs['buy_prices'][:n_step]
+        sell_prices = inputs['sell_prices'][:n_step]
+        solar_production = inputs['solar_production'][:n_step] * production_adjust(cfg.mode)
+        consumption = inputs['consumption'][:n_step]
+
+        if cfg.use_battery:
+            targets = self.targets(inputs['times'][:n_step], buy_prices, sell_prices, solar_production, consumption,
+                                   battery)
+            # Keep the grid power within the ampacity where the net demand allows it
+            net_production = solar_production - consumption
+            targets = np.clip(targets, np.minimum(net_production - cfg.ampacity, 0),
+                              np.maximum(net_production + cfg.ampacity, 0))
+            battery_actions, battery_socs = _dispatch(
+                np.asarray(targets, dtype=float), float(battery.soc), float(battery.safe_level),
+                float(battery.capacity), float(battery.max_charge_rate), float(battery.max_discharge_rate),
+                float(battery.efficiency), float(dt))
+        else:
+            battery_actions, battery_socs = np.zeros(n_step), np.full(n_step, battery.soc)
+
+        # The grid meets the remaining demand and takes the remaining production
+        grid_actions = consumption + battery_actions - solar_production
+        recorder = ResultRecorder(n_step, dt=dt)
+        recorder.record(0, battery_actions, grid_actions, battery_socs)
+        return recorder.to_frame(inputs['times'], buy_prices, sell_prices, solar_production, consumption)
+
+    @abstractmethod
+    def targets(self, times, buy_prices, sell_prices, solar_production, consumption, battery):
+        """Target battery actions of every time step."""
+
+
+class MPCPolicy(DispatchPolicy):
+    """Receding-horizon SmartGridMPC, see simulation.run_simulation. Horizon and scenarios come from cfg."""
+    name = 'mpc'
+
+    def __init__(self, delta_hour=24, solver='linprog', verbose=False):
+        self.delta_hour = delta_hour
+        self.solver = solver
+        self.verbose = verbose
+
+    def run(self, inputs, cfg=None, n_hour=None, **overrides):
+        return run_simulation(inputs, cfg, n_hour=n_hour, delta_hour=self.delta_hour, solver=self.solver,
+                              verbose=self.verbose, **overrides)
+
+
+class NoBatteryPolicy(RuleBasedPolicy):
+    """The battery stays idle, the grid meets the net demand."""
+    name = 'no_battery'
+
+    def run(self, inputs, cfg=None, n_hour=None, **overrides):
+        return super().run(inputs, cfg, n_hour=n_hour, **{**overrides, 'use_battery': False})
+
+    def targets(self, times, buy_prices, sell_prices, solar_production, consumption, battery):
+        return np.zeros(len(times))
+
+
+class GreedyPolicy(RuleBasedPolicy):
+    """Self-consumption: store surplus solar production and discharge to cover the deficit."""
+    name = 'greedy'
+
+    def targets(self, times, buy_prices, sell_prices, solar_production, consumption, battery):
+        return solar_production - consumption
+
+
+class TOUPolicy(RuleBasedPolicy):
+    """
+    Time-of-use arbitrage on the TOU periods of the tariff.
+
+    Charge from the grid at the full rate in the super off-peak hours without solar production, discharge to cover
+    the deficit in the on-peak hours and at the full rate when selling pays more than buying. In the other hours
+    only surplus solar is stored.
+    """
+    name = 'tou'
+    uses_tariff = True
+
+    def __init__(self, tariff_file=None):
+        from price_forecast import PriceForecast
+        self.price_forecast = PriceForecast(tariff_file)
+
+    def targets(self, times, buy_prices, sell_prices, solar_production, consumption, battery):
+        periods = self.price_forecast.periods(times)
+        net_production = solar_production - consumption
+        targets = np.maximum(net_production, 0)
+        grid_charge = (periods == 'Super Off-Peak') & (solar_production <= 0)
+        targets = np.where(grid_charge, battery.max_charge_rate, targets)
+        targets = np.where(periods == 'On-Peak', net_production, targets)
+        return np.where(sell_prices > buy_prices, -battery.max_discharge_rate, targets)
+
+
+policies = {policy.name: policy for policy in (MPCPolicy, GreedyPolicy, TOUPolicy, NoBatteryPolicy)}
+
+
+def make_policy(name, tariff_file=None, **kwargs):
+    """Policy by name. tariff_file goes to the policies that read the tariff themselves, it must price the inputs."""
+    if name not in policies:
+        raise ValueError(f"Unknown policy '{name}', expected one of {tuple(policies)}")
+    if tariff_file is not None and getattr(policies[name], 'uses_tariff', False):
+        kwargs['tariff_file'] = tariff_file
+    return policies[name](**kwargs)
+
+
+def compare_policies(inputs, cfg=None, names=tuple(policies), n_hour=None, results=None, cpu_seconds=None):
+    """
+    Simulate every policy with a battery and the settings of cfg (default Config()) and compare net cost and CPU
+    time. The inputs must be priced with cfg.tariff_file.
+
+    results and cpu_seconds can hold the results and CPU time of already simulated policies by name, those are
+    not simulated again.
+
+    Returns:
+        pd.DataFrame: one row per policy with net cost, savings over no battery and savings per CPU-second
+    """
+    import pandas as pd
+
+    cfg = cfg or Config()
+    results = dict(results or {})
+    cpu_seconds = dict(cpu_seconds or {})
+    rows = []
+    for name in names:
+        if name not in results:
+            start = time.process_time()
+            policy = make_policy(name, tariff_file=cfg.tariff_file)
+            results[name] = policy.run(inputs, cfg, n_hour=n_hour, use_battery=True)
+            cpu_seconds[name] = time.process_time() - start
+        rows.append({'policy': name, 'net_cost': -results[name]['income'].sum(),
+                     'cpu_seconds': cpu_seconds.get(name, np.nan)})
+
+    comparison = pd.DataFrame(rows).set_index('policy')
+    if 'no_battery' in comparison.index:
+        comparison['savings'] = comparison.loc['no_battery', 'net_cost'] - comparison['net_cost']
+        comparison['savings_per_cpu_second'] = comparison['savings'] / comparison['cpu_seconds']
+    if 'mpc' in comparison.index:
+        comparison['cost_vs_mpc'] = comparison['net_cost'] - comparison.loc['mpc', 'net_cost']
+    return comparison
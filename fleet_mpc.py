@@ -0,0 +1,105 @@
+import numpy as np
+import scipy.sparse as sp
+from linear_program import MPCLinearProgram, solve_lp
+
+
+class FleetMPC:
+    """
+    MPC for a fleet of homes solved as one block-diagonal sparse LP.
+
+    Every home has its own battery and the per-home constraints of SmartGridMPC. With feeder_ampacity set,
+    the total grid power of the fleet is limited in both directions every hour, which couples the homes.
+    """
+
+    def __init__(self, batteries, ampacity, horizon=24, feeder_ampacity=None, use_battery=True, dt=1.0,
+                 degradation_cost=0.0, terminal_soc_value=0.0):
+        self.batteries = batteries
+        self.ampacity = ampacity
+        self.horizon = horizon  # number of time steps
+        self.dt = dt  # hours per time step
+        self.feeder_ampacity = feeder_ampacity
+        self.use_battery = use_battery
+        self.degradation_cost = degradation_cost
+        self.terminal_soc_value = terminal_soc_value
+
+        self.homes = [MPCLinearProgram(battery, horizon, use_battery=self.use_battery, dt=dt,
+                                       degradation_cost=self.degradation_cost,
+                                       terminal_soc_value=self.terminal_soc_value)
+                      for battery in batteries]
+        self.A_eq = sp.block_diag([home.A_eq for home in self.homes], format='csr')
+        self.n_var = sum(home.n_var for home in self.homes)
+
+        self.A_ub = None
+        self.b_ub = None
+        if feeder_ampacity is not None:
+            # -feeder_ampacity <= sum_i (b_it - s_it) <= feeder_ampacity
+            H = horizon
+            eye = sp.identity(H, format='csr')
+            zero = sp.csr_matrix((H, H))
+            net_grid = sp.hstack([sp.hstack([zero, zero, eye, -eye, zero]) for _ in self.homes], format='csr')
+            self.A_ub = sp.vstack([net_grid, -net_grid], format='csr')
+            self.b_ub = np.full(2 * H, float(feeder_ampacity))
+
+    def grid_limits(self, solar_production, consumption):
+        """Per-home maximum grid power to buy and to sell over the horizon, as in SmartGridMPC."""
+        if not self.use_battery:
+            net_demand = consumption - solar_production
+            return (np.minimum(self.ampacity, np.maximum(net_demand.max(axis=1), 0)),
+                    np.minimum(self.ampacity, np.maximum(-net_demand.min(axis=1), 0)))
+        max_charge_rate = np.array([battery.max_charge_rate for battery in self.batteries])
+        max_discharge_rate = np.array([battery.max_discharge_rate for battery in self.batteries])
+        max_buy_grid_power = np.minimum(self.ampacity, consumption.mean(axis=1) + max_charge_rate)
+        max_sell_grid_power = np.minimum(self.ampacity, solar_production.mean(axis=1) + max_discharge_rate)
+        return max_buy_grid_power, max_sell_grid_power
+
+    def optimize(self, buy_prices, sell_prices, solar_production, consumption):
+        """
+        Optimize battery and grid actions of all homes over the prediction horizon.
+
+        Args:
+            buy_prices, sell_prices: (H,) prices shared by the fleet or (N, H) per-home prices
+            solar_production, consumption: (N, H) forecasts
+
+        Returns:
+            Tuple of (battery_actions, grid_actions), each (N, H)
+        """
+        n_home, H = len(self.homes), self.horizon
+        buy_prices = np.broadcast_to(buy_prices, (n_home, H))
+        sell_prices = np.broadcast_to(sell_prices, (n_home, H))
+        solar_production = np.asarray(solar_production, dtype=float)
+        consumption = np.asarray(consumption, dtype=float)
+        max_buy_grid_power, max_sell_grid_power = self.grid_limits(solar_production, consumption)
+
+        buy_index = []
+        sell_index = []
+        charge_index = []
+        offset = 0
+        for i, (home, battery) in enumerate(zip(self.homes, self.batteries)):
+            home.update(buy_prices[i], sell_prices[i], solar_production[i], consumption[i], battery.soc,
+                        max_buy_grid_power[i], max_sell_grid_power[i])
+            arbitrage = np.flatnonzero(sell_prices[i] > buy_prices[i])
+            buy_index.append(offset + 2 * H + arbitrage)
+            sell_index.append(offset + 3 * H + arbitrage)
+            charge_index.append(offset + np.arange(H))
+            offset += home.n_var
+
+        x, result = solve_lp(
+            np.concatenate([home.cost for home in self.homes]),
+            self.A_eq,
+            np.concatenate([home.b_eq for home in self.homes]),
+            np.concatenate([home.bounds for home in self.homes]),
+            np.concatenate(buy_index),
+            np.concatenate(sell_index),
+            A_ub=self.A_ub,
+            b_ub=self.b_ub,
+            charge_index=np.concatenate(charge_index),
+            discharge_index=np.concatenate(charge_index) + H,
+        )
+
+        if x is None:
+            print(f"Fleet optimization failed: {result.message}")
+            # Fall back to no battery action, the grid meets net demand
+            return np.zeros((n_home, H)), consumption - solar_production
+
+        x = x.reshape(n_home, -1)
+        return x[:, :H] - x[:, H:2 * H], x[:, 2 * H:3 * H] - x[:, 3 * H:4 * H]
@@ -0,0 +1,143 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog, milp, Bounds, LinearConstraint
+
+
+class MPCLinearProgram:
+    """
+    Exact linear-program form of the SmartGridMPC problem.
+
+    The battery action is split into charge c_t >= 0 and discharge d_t >= 0, and the grid action into
+    buy b_t >= 0 and sell s_t >= 0. The state of charge e_t after each step is kept as a variable so
+    that the constraint matrix stays sparse (O(horizon) non-zeros):
+
+        x = [c, d, b, s, e]
+        min   sum(p_b * b - p_s * s + w * (c + d)) * dt - v * e_T
+        s.t.  -c + d + b - s = consumption - solar              (power balance)
+              e_t - e_{t-1} - (eta * c_t - d_t / eta) * dt = 0  (SOC dynamics, e_0 = soc)
+              safe_level <= e_t <= capacity
+
+    Charging and discharging in the same step would burn energy through the efficiency losses, which pays when
+    buying is paid for or the export is capped. Such solutions get a binary direction per step and are solved
+    again, so that the planned SOC is the one that BatterySystem.apply gets from the net battery action.
+
+    w is the degradation cost per kWh of battery throughput and v the value of a kWh left in the battery at
+    the end of the horizon. Both only change constant cost entries, so the problem stays as sparse.
+    """
+
+    def __init__(self, battery, horizon, use_battery=True, dt=1.0, degradation_cost=0.0, terminal_soc_value=0.0):
+        self.battery = battery
+        self.horizon = horizon  # number of time steps
+        self.dt = dt  # hours per time step
+        self.use_battery = use_battery
+        self.degradation_cost = degradation_cost  # $/kWh of throughput
+        self.terminal_soc_value = terminal_soc_value  # $/kWh of SOC at the end of the horizon
+        self.n_var = 5 * horizon
+
+        H = horizon
+        eta = battery.efficiency
+        dt = self.dt
+        eye = sp.identity(H, format='csr')
+        zero = sp.csr_matrix((H, H))
+        balance = sp.hstack([-eye, eye, eye, -eye, zero])
+        dynamics = sp.hstack([-eta * dt * eye, dt / eta * eye, zero, zero, eye - sp.eye(H, k=-1)])
+        self.A_eq = sp.vstack([balance, dynamics], format='csr')
+
+        # Problem data that changes between solves, updated in place
+        self.cost = np.zeros(self.n_var)
+        self.cost[:2 * H] = degradation_cost * dt
+        self.cost[-1] = -terminal_soc_value
+        self.b_eq = np.zeros(2 * H)
+        self.bounds = np.zeros((self.n_var, 2))
+        if use_battery:
+            self.bounds[:H, 1] = battery.max_charge_rate
+            self.bounds[H:2 * H, 1] = battery.max_discharge_rate
+        self.bounds[4 * H:, 0] = battery.safe_level
+        self.bounds[4 * H:, 1] = battery.capacity
+
+    def update(self, buy_prices, sell_prices, solar_production, consumption, soc,
+               max_buy_grid_power, max_sell_grid_power):
+        """Write the prices, right-hand sides and grid bounds of one horizon into the problem."""
+        H = self.horizon
+        self.cost[2 * H:3 * H] = np.multiply(buy_prices, self.dt)
+        self.cost[3 * H:4 * H] = np.multiply(sell_prices, -self.dt)
+        np.subtract(consumption, solar_production, out=self.b_eq[:H])
+        self.b_eq[H] = soc
+        self.bounds[2 * H:3 * H, 1] = max_buy_grid_power
+        self.bounds[3 * H:4 * H, 1] = max_sell_grid_power
+
+    def decode_solution(self, x):
+        """Decode the LP vector into battery and grid actions."""
+        H = self.horizon
+        battery_actions = x[:H] - x[H:2 * H]  # charge (+), discharge (-)
+        grid_actions = x[2 * H:3 * H] - x[3 * H:4 * H]  # buy (+), sell (-)
+        return battery_actions, grid_actions
+
+    def solve(self, buy_prices, sell_prices, solar_production, consumption, soc,
+              max_buy_grid_power, max_sell_grid_power):
+        """
+        Solve the LP for one horizon. The constraint matrix is reused, only the data vectors are updated.
+
+        Returns:
+            Tuple of (x, result), x is None if the solver did not find an optimum
+        """
+        H = self.horizon
+        self.update(buy_prices, sell_prices, solar_production, consumption, soc,
+                    max_buy_grid_power, max_sell_grid_power)
+        arbitrage = np.flatnonzero(np.asarray(sell_prices) > np.asarray(buy_prices))
+        return solve_lp(self.cost, self.A_eq, self.b_eq, self.bounds, 2 * H + arbitrage, 3 * H + arbitrage,
+                        charge_index=np.arange(H), discharge_index=H + np.arange(H))
+
+
+def solve_lp(cost, A_eq, b_eq, bounds, buy_index=(), sell_index=(), A_ub=None, b_ub=None, charge_index=(),
+             discharge_index=(), tol=1e-7):
+    """
+    Solve min cost @ x subject to A_eq x = b_eq, A_ub x <= b_ub and bounds with HiGHS.
+
+    buy_index and sell_index list the (buy, sell) variable pairs of the hours where the sell price exceeds the
+    buy price. Buying and selling in the same hour would be an unbounded arbitrage in the split formulation,
+    so each of those pairs gets a binary direction variable and the problem is solved as a MILP.
+
+    charge_index and discharge_index list all (charge, discharge) variable pairs. If the optimum charges and
+    discharges more than tol in the same step, every pair gets a binary direction variable as well and the
+    problem is solved again.
+
+    Returns:
+        Tuple of (x, result), x is None if the solver did not find an optimum
+    """
+    x, result = _solve(cost, A_eq, b_eq, bounds, buy_index, sell_index, A_ub, b_ub)
+    if x is not None and len(charge_index) and (np.minimum(x[charge_index], x[discharge_index]) > tol).any():
+        x, result = _solve(cost, A_eq, b_eq, bounds, np.concatenate([buy_index, charge_index]).astype(int),
+                           np.concatenate([sell_index, discharge_index]).astype(int), A_ub, b_ub)
+    return x, result
+
+
+def _solve(cost, A_eq, b_eq, bounds, buy_index, sell_index, A_ub, b_ub):
+    """Solve the LP, or the MILP with a binary direction variable for each (buy_index, sell_index) pair."""
+    n_var = len(cost)
+    n = len(buy_index)
+    if n == 0:
+        result = linprog(cost, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+        x = result.x if result.status == 0 else None
+        return x, result
+
+    # b <= max_buy * z, s <= max_sell * (1 - z)
+    rows = np.arange(n)
+    max_buy = bounds[buy_index, 1]
+    max_sell = bounds[sell_index, 1]
+    buy_only = sp.hstack([sp.csr_matrix((np.ones(n), (rows, buy_index)), shape=(n, n_var)), -sp.diags(max_buy)])
+    sell_only = sp.hstack([sp.csr_matrix((np.ones(n), (rows, sell_index)), shape=(n, n_var)), sp.diags(max_sell)])
+    constraints = [
+        LinearConstraint(sp.hstack([A_eq, sp.csr_matrix((A_eq.shape[0], n))]), b_eq, b_eq),
+        LinearConstraint(sp.vstack([buy_only, sell_only]), -np.inf, np.concatenate([np.zeros(n), max_sell])),
+    ]
+    if A_ub is not None:
+        constraints.append(LinearConstraint(sp.hstack([A_ub, sp.csr_matrix((A_ub.shape[0], n))]), -np.inf, b_ub))
+    result = milp(
+        np.concatenate([cost, np.zeros(n)]),
+        constraints=constraints,
+        integrality=np.concatenate([np.zeros(n_var), np.ones(n)]),
+        bounds=Bounds(np.concatenate([bounds[:, 0], np.zeros(n)]), np.concatenate([bounds[:, 1], np.ones(n)])),
+    )
+    x = result.x[:n_var] if result.status == 0 else None
+    return x, result
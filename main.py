@@ -1,134 +1,13 @@
+import argparse
+import dataclasses
 import os
+import time
 import numpy as np
-import pandas as pd
-from price_forecast import PriceForecast
-from solar_simulator import SolarProductionSimulator
-from consumption_simulator import ConsumptionSimulator
-from battery_system import BatterySystem
-from smart_grid_mpc import SmartGridMPC
-from config import mode, capacity, c_rate, min_battery_level, efficiency, ampacity, n_hour, horizon, use_battery
-
-np.random.seed(1)
-
-# Run simulation and analyze results
-delta_hour = 24
-charge_rate = capacity * c_rate
-battery = BatterySystem(
-    capacity=capacity,  # kWh
-    max_charge_rate=charge_rate,  # kW
-    max_discharge_rate=charge_rate,  # kW
-    min_battery_level=min_battery_level,
-    efficiency=efficiency
-)
-
-mpc_controller = SmartGridMPC(battery, ampacity=ampacity, horizon=horizon)
-
-# Generate sample data
-n_hour_pad = n_hour + horizon
-times = pd.date_range('2024-01-01', periods=n_hour_pad, freq='h')
-# times = pd.date_range('2024-09-01', periods=n_hour_pad, freq='h')
-
-buy_prices = np.zeros(times.shape)
-sell_prices = np.zeros(times.shape)
-solar_production = np.zeros(times.shape)
-consumption = np.zeros(times.shape)
-price_forecast = PriceForecast()
-solar_simulator = SolarProductionSimulator()
-consumption_simulator = ConsumptionSimulator()
-for i, t in enumerate(times):
-    buy_prices[i] = price_forecast.get_buy_price(t.year, t.month, t.day, t.hour)
-    sell_prices[i] = price_forecast.get_sell_price(t.month, t.hour)
-    solar_production[i] = solar_simulator.simulate(t.month, t.day, t.hour)
-    consumption[i] = consumption_simulator.simulate(t.month, t.day, t.hour)
-
-adjust = 16176.58 / 13983.73
-if mode == 'low_prod':
-    adjust *= 0.9
-elif mode == 'high_prod':
-    adjust *= 1.1
-solar_production *= adjust
-
-# Initialize results DataFrame
-results = pd.DataFrame({
-    'time': times[:n_hour],
-    'buy_price': buy_prices[:n_hour],
-    'sell_price': sell_prices[:n_hour],
-    'solar_production': solar_production[:n_hour],
-    'consumption': consumption[:n_hour],
-    'battery_action': np.nan,
-    'grid_action': np.nan,
-    'battery_soc': np.nan,
-    'buying_cost': np.nan,
-    'selling_revenue': np.nan
-})
-
-# Simulate system operation
-for t in range(0, n_hour, delta_hour):
-    if t % 24 == 0:
-        print(f'MPC for day {t // 24 + 1}, {times[t]}')
-    # Get predictions for the next horizon
-    buy_price_pred = buy_prices[t:t + horizon]
-    sell_price_pred = sell_prices[t:t + horizon]
-    production_pred = solar_production[t:t + horizon]
-    consumption_pred = consumption[t:t + horizon]
-
-    # Pad predictions if needed
-    input_length = len(buy_price_pred)
-    if input_length < horizon:
-        print(f'Pad: input_length < horizon: {input_length} < {horizon}')
-        # Repeat the last value to fill the horizon
-        pad_width = (0, horizon - input_length)
-        buy_price_pred = np.pad(buy_price_pred, pad_width, 'edge')
-        sell_price_pred = np.pad(sell_price_pred, pad_width, 'edge')
-        production_pred = np.pad(production_pred, pad_width, 'edge')
-        consumption_pred = np.pad(consumption_pred, pad_width, 'edge')
-
-    # Get optimal actions
-    battery_action, grid_action = mpc_controller.optimize(
-        buy_price_pred,
-        sell_price_pred,
-        production_pred,
-        consumption_pred
-    )
-
-    # Store the next delta_hour of actions (or remaining hours if less than delta_hour)
-    steps_to_store = min(delta_hour, n_hour - t)
-    for i in range(steps_to_store):
-        ti = t + i
-
-        # Store actions and states
-        results.loc[ti, 'battery_action'] = battery_action[i]
-        results.loc[ti, 'grid_action'] = grid_action[i]
-        results.loc[ti, 'battery_soc'] = battery.soc
-
-        # Calculate costs and revenues
-        if grid_action[i] > 0:  # Buy
-            results.loc[ti, 'buying_cost'] = grid_action[i] * buy_prices[ti]
-            results.loc[ti, 'selling_revenue'] = 0
-        else:  # Sell
-            results.loc[ti, 'buying_cost'] = 0
-            results.loc[ti, 'selling_revenue'] = -grid_action[i] * sell_prices[ti]
-
-        # Update battery state
-        if battery_action[i] > 0:  # Charging
-            battery.soc += battery_action[i] * battery.efficiency
-        else:  # Discharging
-            battery.soc += battery_action[i] / battery.efficiency
-
-        battery.soc = np.clip(battery.soc, 0, battery.capacity)
-
-# Print summary statistics
-print("\nSimulation Summary:")
-print(f"Total Hours: {results.shape[0]}, Delta Hours: {delta_hour}")
-print(f"Valid Results: {results['battery_action'].notna().sum()} hours")
-
-# Calculate profits
-results['income'] = results['selling_revenue'] - results['buying_cost']
-results['cum_income'] = results['income'].cumsum()
-
-results['consumption_cost'] = results['consumption'] * results['buy_price']
-results['cum_consumption_cost'] = results['consumption_cost'].cumsum()
-results['cum_solar_earn'] = results['cum_consumption_cost'] + results['cum_income']
+from simulation import load_inputs, run_simulation
+from validation import validate_results
+from dispatch_policy import make_policy, compare_policies, policies
+from result_store import write_results, resolve_format, formats
+from config import Config
 
 
 def make_dir(dir):
@@ -136,28 +15,86 @@ def make_dir(dir):
         os.makedirs(dir, exist_ok=True)
 
 
-dir = f'data/output/{mode}'
-make_dir(dir)
-results.to_csv(f'{dir}/{mode}_{capacity if use_battery else 0}.csv', encoding='utf-8', index=False)
-
-# Validity Check
-arr = results[['solar_production', 'consumption', 'battery_action', 'grid_action', 'battery_soc']].values
-for i in range(arr.shape[0]):
-    p = arr[i, 0]
-    c = arr[i, 1]
-    charge = arr[i, 2]
-    buy = arr[i, 3]
-    soc1 = arr[i, 4]
-    # print(f'balance check: {abs((c + charge) - (p + buy)) < 1e-6}')
-    if not abs((c + charge) - (p + buy)) < 1e-6:
-        print('balance check False')
-    if i < arr.shape[0] - 1:
-        soc = arr[i + 1, 4]
-        if charge > 0:
-            # print(f'charge check: {abs(soc - soc1 - charge * battery.efficiency) < 1e-6}')
-            if not abs(soc - soc1 - charge * battery.efficiency) < 1e-6:
-                print('charge check False')
-        else:
-            # print(f'charge check: {abs(soc - soc1 - charge / battery.efficiency) < 1e-6}')
-            if not abs(soc - soc1 - charge / battery.efficiency) < 1e-6:
-                print('charge check False')
+def main(cfg=None):
+    """Simulate cfg.n_day days of the configured policy and write the results, with cfg.compare compare policies."""
+    cfg = cfg or Config()
+    np.random.seed(1)
+
+    # Run simulation and analyze results
+    delta_hour = 24
+
+    # Generate sample data
+    n_hour_pad = cfg.n_hour + cfg.horizon
+    inputs = load_inputs(n_hour_pad, consumption_mode=cfg.consumption_mode, dt=cfg.dt, tariff_file=cfg.tariff_file)
+    # inputs = load_inputs(n_hour_pad, consumption_mode=cfg.consumption_mode, start='2024-09-01', dt=cfg.dt)
+
+    start = time.process_time()
+    if cfg.policy == 'mpc':
+        results, telemetry, solver_summary = run_simulation(inputs, cfg, delta_hour=delta_hour,
+                                                            return_telemetry=True)
+    else:
+        policy = make_policy(cfg.policy, tariff_file=cfg.tariff_file)
+        results = policy.run(inputs, cfg)
+        telemetry, solver_summary = None, {}
+    cpu_seconds = time.process_time() - start
+
+    # Print summary statistics
+    print(f"\nSimulation Summary ({cfg.policy}):")
+    print(f"Total Hours: {results.shape[0] * cfg.dt:g} ({results.shape[0]} steps of {cfg.step_minutes} minutes), "
+          f"Delta Hours: {delta_hour}")
+    print(f"Valid Results: {results['battery_action'].notna().sum()} steps")
+
+    if solver_summary:
+        print("\nSolver Summary:")
+        for key, value in solver_summary.items():
+            print(f"{key}: {value}")
+
+    capacity = cfg.capacity if cfg.use_battery else 0
+    dir = f'data/output/{cfg.mode}'
+    make_dir(dir)
+    if resolve_format(cfg.output_format) == 'csv':
+        results.to_csv(f'{dir}/{cfg.mode}_{capacity}.csv', encoding='utf-8', index=False)
+    else:
+        write_results(results, 'data/output', cfg.mode, capacity, cfg.consumption_mode, format=cfg.output_format)
+    if telemetry is not None:
+        telemetry.to_csv(f'{dir}/{cfg.mode}_{capacity}_telemetry.csv', encoding='utf-8', index=False)
+
+    # Validity Check
+    report = validate_results(results, cfg)
+    print(report.summary())
+
+    if cfg.compare:
+        # Cost of the policy against the MPC and the rule-based baselines, reusing the run above
+        previous = {cfg.policy: results} if cfg.use_battery else {}
+        comparison = compare_policies(inputs, cfg, results=previous, cpu_seconds={cfg.policy: cpu_seconds})
+        print("\nPolicy Comparison:")
+        print(comparison.to_string(float_format='{:.3f}'.format))
+    return results
+
+
+def parse_args():
+    """Command line overrides of the defaults in config.py."""
+    default = Config()
+    parser = argparse.ArgumentParser(description='Run the smart grid simulation.')
+    parser.add_argument('--mode', default=default.mode, choices=['low_prod', 'mid_prod', 'high_prod'])
+    parser.add_argument('--consumption-mode', default=default.consumption_mode)
+    parser.add_argument('--n-day', type=int, default=default.n_day, help='number of days to simulate')
+    parser.add_argument('--horizon', type=int, default=default.horizon, help='MPC horizon in hours')
+    parser.add_argument('--step-minutes', type=int, default=default.step_minutes, help='time step, e.g. 60, 15 or 5')
+    parser.add_argument('--policy', default=default.policy, choices=tuple(policies))
+    parser.add_argument('--compare', action='store_true', default=default.compare,
+                        help='also simulate every policy and compare their costs')
+    parser.add_argument('--use-battery', type=int, default=int(default.use_battery), choices=[0, 1])
+    parser.add_argument('--n-battery', type=int, default=default.n_battery)
+    parser.add_argument('--n-scenario', type=int, default=default.n_scenario,
+                        help='forecast scenarios of the scenario MPC, 0 for the deterministic MPC')
+    parser.add_argument('--seed', type=int, default=default.seed, help='seed of the forecast scenarios')
+    parser.add_argument('--tariff-file', default=default.tariff_file)
+    parser.add_argument('--output-format', default=default.output_format, choices=formats)
+    overrides = vars(parser.parse_args())
+    overrides['use_battery'] = bool(overrides['use_battery'])
+    return dataclasses.replace(default, **overrides)
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,108 @@
+import argparse
+import hashlib
+import os
+import shutil
+import numpy as np
+
+cache_dir = 'data/cache'
+cache_version = 1  # bump when the layout of the cached arrays changes
+
+
+def cache_key(source, mode=None):
+    """Key of a parsed profile, changes whenever the source file is modified."""
+    stat = os.stat(source)
+    fingerprint = f'{cache_version}|{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|{mode}'
+    name = os.path.splitext(os.path.basename(source))[0]
+    return f'{name}_{hashlib.sha1(fingerprint.encode()).hexdigest()[:16]}'
+
+
+def load_profile(source, parse, mode=None, use_cache=True):
+    """
+    Load the (values, valid) arrays of a profile, parsing the source file only on a cache miss.
+
+    Args:
+        source: path of the CSV file
+        parse: function returning the (values, valid) arrays parsed from the source
+        mode: extra key for sources that are parsed differently per mode
+        use_cache: whether to read and write the cache
+
+    Returns:
+        Tuple of (values, valid), memory-mapped read-only arrays on a cache hit
+    """
+    if not use_cache:
+        return parse()
+
+    path = os.path.join(cache_dir, cache_key(source, mode))
+    values_path, valid_path = f'{path}.values.npy', f'{path}.valid.npy'
+    if os.path.exists(values_path) and os.path.exists(valid_path):
+        return np.load(values_path, mmap_mode='r'), np.load(valid_path, mmap_mode='r')
+
+    values, valid = parse()
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to temporary files first so that concurrent workers never read a partial file
+    for target, array in ((values_path, values), (valid_path, valid)):
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, target)
+    return values, valid
+
+
+def profile_table(values, valid, fallback):
+    """
+    Complete (month, day, hour) table of a profile, indexed by month 1-12, day 1-31 and hour 0-23.
+
+    Hours missing from the data take fallback(hour) for an array of hours 0-23, and Feb 29 falls back to Feb 28.
+    """
+    table = np.array(values, dtype=float)
+    missing = ~np.asarray(valid)
+    table[missing] = np.broadcast_to(fallback(np.arange(24)), table.shape)[missing]
+    table[2, 29] = np.where(missing[2, 29], table[2, 28], table[2, 29])
+    return table
+
+
+def profile_series(table, times):
+    """
+    Values of a profile table for every timestamp of a DatetimeIndex.
+
+    Timestamps between two hours are linearly interpolated between the hourly values.
+    """
+    import pandas as pd
+
+    hours = times.floor('h')
+    values = table[hours.month, hours.day, hours.hour]
+    fraction = np.asarray((times - hours) / pd.Timedelta(hours=1))
+    if not fraction.any():
+        return values
+    next_hours = hours + pd.Timedelta(hours=1)
+    return values + fraction * (table[next_hours.month, next_hours.day, next_hours.hour] - values)
+
+
+def warm_cache(consumption_modes=('base',)):
+    """Parse the bundled input profiles once so that later runs load them from the cache."""
+    from solar_simulator import SolarProductionSimulator
+    from consumption_simulator import ConsumptionSimulator
+    SolarProductionSimulator()
+    for consumption_mode in consumption_modes:
+        ConsumptionSimulator(mode=consumption_mode)
+
+
+def clear_cache():
+    """Delete all cached profiles."""
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the cache of parsed input profiles.')
+    parser.add_argument('action', choices=['warm', 'clear'])
+    parser.add_argument('--consumption-mode', nargs='+', default=['base'])
+    args = parser.parse_args()
+    if args.action == 'warm':
+        warm_cache(args.consumption_mode)
+    else:
+        clear_cache()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import os
+import re
+from multiprocessing import Pool
+import numpy as np
+import result_store
+
+default_blue = '#1f77b4'
+dark_orange = '#cc5500'
+
+# Results CSV written by main.py or sweep.py, e.g. mid_prod_27.0.csv
+result_file = re.compile(r'^(?P<mode>\w+?)_(?P<capacity>\d+(?:\.\d+)?)\.csv$')
+
+
+def read_results(path, columns=None, n_day=None):
+    """
+    Read a results CSV written by main.py or sweep.py, optionally only some columns and the first n_day days.
+    """
+    import pandas as pd
+
+    usecols = None if columns is None else ['time', *[column for column in columns if column != 'time']]
+    results = pd.read_csv(path, usecols=usecols, parse_dates=['time'])
+    if n_day is not None:
+        results = results[results['time'] < results['time'].iloc[0] + pd.Timedelta(days=n_day)]
+    return results
+
+
+def capacity_from_path(path):
+    """Battery capacity in the name of an output file, e.g. 27.0 for mid_prod_27.0.csv."""
+    match = result_file.match(os.path.basename(path))
+    if match is None:
+        raise ValueError(f'{path} is not named <mode>_<capacity>.csv')
+    return float(match['capacity'])
+
+
+def step_hours(times):
+    """Hours per time step of a results time column, 1 for a single step."""
+    import pandas as pd
+
+    times = pd.DatetimeIndex(times)
+    if len(times) < 2:
+        return 1.0
+    return (times[1] - times[0]) / pd.Timedelta(hours=1)
+
+
+def daily_mean(times, values):
+    """Mean of each calendar day, repeated for every time step of that day."""
+    import pandas as pd
+
+    days, index = np.unique(pd.DatetimeIndex(times).normalize(), return_inverse=True)
+    values = np.asarray(values, dtype=float)
+    return (np.bincount(index, weights=values, minlength=len(days)) / np.bincount(index, minlength=len(days)))[index]
+
+
+def decimate(results, max_points):
+    """Average blocks of consecutive rows so that at most max_points rows are left, keeping the first time."""
+    if max_points is None or len(results) <= max_points:
+        return results
+    block = -(-len(results) // max_points)  # ceil
+    group = np.arange(len(results)) // block
+    decimated = results.drop(columns='time').groupby(group).mean()
+    decimated.insert(0, 'time', results['time'].values[::block])
+    return decimated.reset_index(drop=True)
+
+
+def print_summary(results, capacity, dt=None):
+    """Print energy and cost totals of a results DataFrame with dt hours per step (default from its times)."""
+    dt = step_hours(results['time']) if dt is None else dt
+    # Power (kW) per step times the step length gives energy (kWh)
+    total_production = results['solar_production'].sum() * dt
+    total_consumption = results['consumption'].sum() * dt
+
+    print(f"\nFinancial Summary:")
+    print(f"Battery Capacity: {capacity} kWh")
+    print(f"Total Production: {total_production:.2f} kWh")
+    print(f"Total Consumption: {total_consumption:.2f} kWh")
+    print(f"Need to buy = ${(total_consumption - total_production) * results['buy_price'].max():.2f}")
+    print(f"Total Buying Cost: ${results['buying_cost'].sum():.2f}")
+    print(f"Total Selling Revenue: ${results['selling_revenue'].sum():.2f}")
+    print(f"Net Income: ${results['income'].sum():.2f}")
+    print(f"Solar Earn: ${results['cum_solar_earn'].iloc[-1]:.2f}")
+    print(f"Average Hourly Income: ${results['income'].sum() / (len(results) * dt):.3f}")
+
+
+def plot_results(results, path, capacity, max_points=None, figsize=(28.4, 16), dpi=100):
+    """
+    Draw prices, power flows, actions, battery SOC and income of a results DataFrame and save the figure to path.
+
+    The figure is rendered off-screen without pyplot, so it never blocks and works on headless machines.
+    Daily means are taken before the series are decimated to at most max_points points.
+    """
+    from matplotlib.figure import Figure
+
+    results = results.assign(
+        avg_solar_production=daily_mean(results['time'], results['solar_production']),
+        avg_consumption=daily_mean(results['time'], results['consumption']),
+    )
+    results = decimate(results, max_points)
+    time = results['time']
+
+    fig = Figure(figsize=figsize)
+    ax1, ax2, ax3, ax4, ax5, ax6 = fig.subplots(6, 1)
+
+    # Plot prices
+    ax1.plot(time, results['buy_price'], label='Buy Price')
+    ax1.plot(time, results['sell_price'], label='Sell Price')
+    ax1.set_ylabel('Price ($/kWh)')
+    ax1.legend(loc='upper left')
+
+    # Plot power flows
+    ax2.plot(time, results['solar_production'], label='Solar Production', color='green')
+    ax2.plot(time, results['consumption'], label='Consumption', color='orange')
+    ax2.plot(time, results['avg_solar_production'], label='Avg Solar Production', color='darkgreen', linewidth=2)
+    ax2.plot(time, results['avg_consumption'], label='Avg Consumption', color=dark_orange, linewidth=2)
+    ax2.fill_between(time, results['solar_production'], 0, color='yellow', alpha=0.2)
+    ax2.fill_between(time, results['consumption'], 0, color='red', alpha=0.2)
+    ax2.set_ylabel('Power (kW)')
+    ax2.legend(loc='upper left')
+
+    # Plot actions
+    ax3.plot(time, results['battery_action'], label='Battery Charge (+) / Discharge (-)')
+    ax3.plot(time, results['grid_action'], label='Purchase (+) / Sell (-) from the grid')
+    ax3.set_ylabel('Power (kW)')
+    ax3.axhline(y=0, color='k', linestyle='-', alpha=0.2)
+    ax3.legend(loc='upper left')
+
+    # Plot battery SOC
+    ax4.plot(time, results['battery_soc'] if capacity else np.zeros(len(time)), label='Battery SOC')
+    ax4.set_ylabel('State of Charge (kWh)')
+    ax4.legend(loc='upper left')
+
+    # Plot income
+    ax5.plot(time, results['income'], label='Surplus and Shortfall to Grid', color=default_blue)
+    ax5.fill_between(time, results['income'], 0, where=(results['income'] >= 0), color='green', alpha=0.3)
+    ax5.fill_between(time, results['income'], 0, where=(results['income'] <= 0), color='red', alpha=0.3)
+    ax5.set_ylabel('$')
+    ax5.axhline(y=0, color='k', linestyle='-', alpha=0.2)
+    ax5.legend(loc='upper left')
+
+    # Plot cumulative earn, cost, and income
+    ax6.plot(time, results['cum_solar_earn'], color='green')
+    ax6.plot(time, results['cum_consumption_cost'], color='orange')
+    label = 'Cumulative Solar + Battery Value' if capacity else 'Cumulative Solar Value'
+    ax6.fill_between(time, results['cum_solar_earn'], 0, color='green', alpha=0.2, label=label)
+    ax6.fill_between(time, results['cum_consumption_cost'], 0, color='red', alpha=0.2,
+                     label='Cumulative Consumption')
+    ax6.set_ylabel('$')
+    ax6.axhline(y=0, color='k', linestyle='-', alpha=0.2)
+    ax6.legend(loc='upper left')
+
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+def _render(path, output_dir, input_dir, n_day, max_points):
+    figure_path = os.path.join(output_dir, os.path.splitext(os.path.relpath(path, input_dir))[0] + '.png')
+    return plot_results(read_results(path, n_day=n_day), figure_path, capacity_from_path(path),
+                        max_points=max_points)
+
+
+def _render_partition(partition, output_dir, input_dir, n_day, max_points):
+    mode, capacity, consumption_mode = partition
+    figure_path = os.path.join(output_dir, consumption_mode, mode, f'{mode}_{capacity}.png')
+    results = result_store.read_results(input_dir, mode, capacity, consumption_mode, n_day=n_day)
+    return plot_results(results, figure_path, capacity, max_points=max_points)
+
+
+def render_reports(input_dir, output_dir='figure', n_day=None, max_points=2000, processes=None):
+    """
+    Render the figure of every results CSV and every columnar result partition below input_dir (e.g. the
+    output_dir of sweep.py) in a process pool. Figures go to <output_dir>/<consumption_mode>/<mode>/ for
+    partitions and mirror the directory layout of the CSVs. Other CSVs, like telemetry or summary tables,
+    are skipped.
+
+    Returns:
+        list of the written figure paths
+    """
+    paths = []
+    for root, _, names in os.walk(input_dir):
+        for name in names:
+            if result_file.match(name):
+                paths.append(os.path.join(root, name))
+            elif name.endswith('.csv'):
+                print(f'Skipping {os.path.join(root, name)}, not a <mode>_<capacity>.csv results file')
+    paths.sort()
+    tasks = [(_render, (path, output_dir, input_dir, n_day, max_points)) for path in paths]
+    tasks += [(_render_partition, (partition, output_dir, input_dir, n_day, max_points))
+              for partition in result_store.list_partitions(input_dir)]
+    with Pool(processes=processes) as pool:
+        results = [pool.apply_async(fn, args) for fn, args in tasks]
+        return [result.get() for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render result figures of many simulation runs in parallel.')
+    parser.add_argument('input_dir', help='directory with the results, e.g. the --output-dir of sweep.py')
+    parser.add_argument('--output-dir', default='figure')
+    parser.add_argument('--n-day', type=int, default=None, help='only plot the first days')
+    parser.add_argument('--max-points', type=int, default=2000, help='decimate longer series')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    for path in render_reports(args.input_dir, args.output_dir, n_day=args.n_day, max_points=args.max_points,
+                               processes=args.processes):
+        print(f'Figure written to {path}')
+
+
+if __name__ == '__main__':
+    main()
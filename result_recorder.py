@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class ResultRecorder:
+    """Records actions and battery states into preallocated columns and builds the results DataFrame once."""
+
+    def __init__(self, n_step, dt=1.0):
+        self.n_step = n_step  # number of time steps
+        self.dt = dt  # hours per time step
+        self.battery_action = np.full(n_step, np.nan)
+        self.grid_action = np.full(n_step, np.nan)
+        self.battery_soc = np.full(n_step, np.nan)
+
+    def record(self, t, battery_actions, grid_actions, battery_socs):
+        """Store the actions applied from step t on and the battery SOC at the start of each of those steps."""
+        n = len(battery_socs)
+        self.battery_action[t:t + n] = battery_actions[:n]
+        self.grid_action[t:t + n] = grid_actions[:n]
+        self.battery_soc[t:t + n] = battery_socs
+
+    def to_frame(self, times, buy_prices, sell_prices, solar_production, consumption):
+        """Build the results DataFrame, computing costs and revenues of each step from the recorded grid actions."""
+        import pandas as pd
+
+        n_step = self.n_step
+        buy_prices = buy_prices[:n_step]
+        sell_prices = sell_prices[:n_step]
+        buy = self.grid_action > 0
+        recorded = ~np.isnan(self.grid_action)
+        results = pd.DataFrame({
+            'time': times[:n_step],
+            'buy_price': buy_prices,
+            'sell_price': sell_prices,
+            'solar_production': solar_production[:n_step],
+            'consumption': consumption[:n_step],
+            'battery_action': self.battery_action,
+            'grid_action': self.grid_action,
+            'battery_soc': self.battery_soc,
+            'buying_cost': np.where(recorded, np.where(buy, self.grid_action * buy_prices * self.dt, 0), np.nan),
+            'selling_revenue': np.where(recorded, np.where(buy, 0, -self.grid_action * sell_prices * self.dt), np.nan),
+        })
+
+        # Calculate profits
+        results['income'] = results['selling_revenue'] - results['buying_cost']
+        results['cum_income'] = results['income'].cumsum()
+
+        results['consumption_cost'] = results['consumption'] * results['buy_price'] * self.dt
+        results['cum_consumption_cost'] = results['consumption_cost'].cumsum()
+        results['cum_solar_earn'] = results['cum_consumption_cost'] + results['cum_income']
+
+        return results
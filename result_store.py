@@ -0,0 +1,131 @@
+import os
+
+formats = ('parquet', 'arrow', 'csv')
+extensions = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def resolve_format(format):
+    """The output format to use: the columnar formats need pyarrow, without it the results are written as CSV."""
+    if format == 'csv':
+        return format
+    if format not in formats:
+        raise ValueError(f"Unknown output format '{format}', expected one of {formats}")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print(f"pyarrow is not installed, writing CSV instead of {format} (pip install pyarrow)")
+        return 'csv'
+    return format
+
+
+def partition_dir(root, mode, capacity, consumption_mode):
+    """Directory of one configuration, e.g. <root>/mode=mid_prod/capacity=27.0/consumption_mode=base."""
+    return os.path.join(root, f'mode={mode}', f'capacity={float(capacity)}', f'consumption_mode={consumption_mode}')
+
+
+def list_partitions(root):
+    """All (mode, capacity, consumption_mode) configurations stored under root."""
+    partitions = []
+    for dirpath, _, names in os.walk(root):
+        if not any(name.endswith(tuple(extensions.values())) for name in names):
+            continue
+        keys = dict(part.split('=', 1) for part in os.path.relpath(dirpath, root).split(os.sep) if '=' in part)
+        if {'mode', 'capacity', 'consumption_mode'} <= keys.keys():
+            partitions.append((keys['mode'], float(keys['capacity']), keys['consumption_mode']))
+    return sorted(partitions)
+
+
+def write_results(results, root, mode, capacity, consumption_mode, format='parquet', rows_per_group=24 * 7,
+                  compression=None):
+    """
+    Write a results DataFrame as one typed, compressed columnar file of its configuration partition.
+
+    The rows are split into row groups (Parquet) or record batches (Arrow IPC) of rows_per_group rows, so that
+    readers skip the ones outside a time range. Parquet is zstd compressed by default. Arrow IPC files are
+    uncompressed by default, which lets read_results memory-map them without copying. Requires pyarrow.
+
+    Returns:
+        str: path of the written file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if format not in extensions:
+        raise ValueError(f"Unknown columnar format '{format}', expected one of {tuple(extensions)}")
+    dir = partition_dir(root, mode, capacity, consumption_mode)
+    os.makedirs(dir, exist_ok=True)
+    path = os.path.join(dir, f'part-0{extensions[format]}')
+
+    table = pa.Table.from_pandas(results, preserve_index=False)
+    if format == 'parquet':
+        pq.write_table(table, path, row_group_size=rows_per_group, compression=compression or 'zstd')
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=rows_per_group)
+    return path
+
+
+def _time_filter(table, start, end):
+    import pandas as pd
+    import pyarrow.compute as pc
+
+    mask = None
+    if start is not None:
+        mask = pc.greater_equal(table['time'], pd.Timestamp(start))
+    if end is not None:
+        before_end = pc.less(table['time'], pd.Timestamp(end))
+        mask = before_end if mask is None else pc.and_(mask, before_end)
+    return table if mask is None else table.filter(mask)
+
+
+def read_results(root, mode, capacity, consumption_mode, columns=None, start=None, end=None, n_day=None):
+    """
+    Read the results of one configuration, only the given columns and the rows with start <= time < end.
+    With n_day, end is n_day days after start or after the first stored time.
+
+    Parquet row groups outside the time range are skipped using their statistics. Arrow IPC files are memory
+    mapped and batches outside the time range are never touched.
+
+    Returns:
+        pd.DataFrame
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    dir = partition_dir(root, mode, capacity, consumption_mode)
+    read_columns = None if columns is None else list(dict.fromkeys(['time', *columns]))
+    parquet_path = os.path.join(dir, 'part-0.parquet')
+    if n_day is not None:
+        if start is None:
+            if os.path.exists(parquet_path):
+                first = pq.ParquetFile(parquet_path, memory_map=True).read_row_group(0, columns=['time'])['time'][0]
+            else:
+                first = pa.ipc.open_file(pa.memory_map(os.path.join(dir, 'part-0.arrow'))).get_batch(0)['time'][0]
+            start = first.as_py()
+        end = pd.Timestamp(start) + pd.Timedelta(days=n_day)
+
+    if os.path.exists(parquet_path):
+        filters = []
+        if start is not None:
+            filters.append(('time', '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append(('time', '<', pd.Timestamp(end)))
+        table = pq.read_table(parquet_path, columns=read_columns, filters=filters or None, memory_map=True)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(os.path.join(dir, 'part-0.arrow')))
+        batches = []
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if len(batch) == 0:
+                continue
+            first, last = batch.column('time')[0].as_py(), batch.column('time')[-1].as_py()
+            if (start is not None and last < pd.Timestamp(start)) or (end is not None and first >= pd.Timestamp(end)):
+                continue
+            batches.append(batch if read_columns is None else batch.select(read_columns))
+        schema = reader.schema if read_columns is None else pa.schema([reader.schema.field(c) for c in read_columns])
+        table = _time_filter(pa.Table.from_batches(batches, schema=schema), start, end)
+
+    results = table.to_pandas()
+    return results if columns is None else results[columns]
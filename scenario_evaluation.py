@@ -0,0 +1,80 @@
+import argparse
+import dataclasses
+import os
+from multiprocessing import Pool
+import pandas as pd
+from simulation import load_inputs, run_simulation
+from scenario_mpc import forecast_scenarios
+from config import Config
+
+# Inputs shared by the worker processes, set by _init_worker
+_inputs = None
+
+
+def _init_worker(inputs):
+    global _inputs
+    _inputs = inputs
+
+
+def _evaluate_sample(sample, controllers, cfg, n_hour, delta_hour, n_scenario):
+    """Simulate every controller against one realization of the forecast errors."""
+    inputs = _inputs
+    # The actual profiles deviate from the forecasts that the controllers see
+    solar_production, consumption = forecast_scenarios(
+        inputs['solar_production'], inputs['consumption'], 1, cfg.solar_forecast_error,
+        cfg.consumption_forecast_error, rng=[cfg.seed, sample], include_nominal=False)
+    actual = {**inputs, 'solar_production': solar_production[0], 'consumption': consumption[0]}
+
+    rows = []
+    for controller in controllers:
+        results = run_simulation(actual, cfg, n_hour=n_hour, delta_hour=delta_hour, verbose=False, forecast=inputs,
+                                 n_scenario=n_scenario if controller == 'scenario' else 0)
+        rows.append({'sample': sample, 'controller': controller, 'net_income': results['income'].sum(),
+                     'buying_cost': results['buying_cost'].sum(), 'selling_revenue': results['selling_revenue'].sum()})
+    return rows
+
+
+def evaluate(inputs, cfg=None, n_sample=8, controllers=('deterministic', 'scenario'), n_hour=None, delta_hour=24,
+             n_scenario=10, processes=None):
+    """
+    Compare the deterministic and the scenario MPC over n_sample realizations of the forecast errors.
+
+    The controllers forecast with the given inputs, while the simulated home follows profiles perturbed by the
+    forecast errors and seed of cfg (default Config()). The samples are simulated in a process pool.
+
+    Returns:
+        pd.DataFrame: net income and grid costs of every sample and controller
+    """
+    cfg = cfg or Config()
+    n_hour = cfg.n_hour if n_hour is None else n_hour
+    tasks = [(sample, controllers, cfg, n_hour, delta_hour, n_scenario) for sample in range(n_sample)]
+    with Pool(processes=processes, initializer=_init_worker, initargs=(inputs,)) as pool:
+        rows = pool.starmap(_evaluate_sample, tasks)
+    return pd.DataFrame([row for sample_rows in rows for row in sample_rows])
+
+
+def main():
+    default = Config()
+    parser = argparse.ArgumentParser(description='Evaluate the scenario MPC against the deterministic MPC '
+                                                 'under forecast errors.')
+    parser.add_argument('--n-day', type=int, default=default.n_day, help='number of days to simulate')
+    parser.add_argument('--n-sample', type=int, default=8, help='realizations of the forecast errors')
+    parser.add_argument('--n-scenario', type=int, default=10, help='forecast scenarios of the scenario MPC')
+    parser.add_argument('--delta-hour', type=int, default=24)
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--out', default='data/output/scenario_evaluation.csv')
+    args = parser.parse_args()
+
+    cfg = dataclasses.replace(default, n_day=args.n_day)
+    inputs = load_inputs(cfg.n_hour + cfg.horizon, consumption_mode=cfg.consumption_mode, dt=cfg.dt,
+                         tariff_file=cfg.tariff_file)
+    evaluation = evaluate(inputs, cfg, n_sample=args.n_sample, delta_hour=args.delta_hour,
+                          n_scenario=args.n_scenario, processes=args.processes)
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    evaluation.to_csv(args.out, encoding='utf-8', index=False)
+    print(evaluation.groupby('controller')[['net_income', 'buying_cost', 'selling_revenue']].agg(['mean', 'std']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.signal import lfilter
+from smart_grid_mpc import SmartGridMPC
+from linear_program import MPCLinearProgram, solve_lp
+
+
+def forecast_scenarios(solar_production, consumption, n_scenario, solar_error=0.2, consumption_error=0.1,
+                       correlation=0.9, rng=None, include_nominal=True):
+    """
+    Perturb solar production and consumption profiles into an ensemble of forecast scenarios.
+
+    The relative errors follow an AR(1) process started at zero, so they grow with the lead time from
+    sqrt(1 - correlation^2) * error towards error. Perturbed values are clipped at zero.
+
+    Returns:
+        Tuple of (solar_production, consumption) scenarios, each (n_scenario, T); with include_nominal the
+        first scenario is the unperturbed profile
+    """
+    rng = np.random.default_rng(rng)
+    solar_production = np.asarray(solar_production, dtype=float)
+    consumption = np.asarray(consumption, dtype=float)
+    n_perturbed = n_scenario - 1 if include_nominal else n_scenario
+
+    noise = rng.standard_normal((2, n_perturbed, len(solar_production)))
+    errors = lfilter([np.sqrt(1 - correlation ** 2)], [1, -correlation], noise, axis=-1)
+    solar_scenarios = np.maximum(solar_production * (1 + solar_error * errors[0]), 0)
+    consumption_scenarios = np.maximum(consumption * (1 + consumption_error * errors[1]), 0)
+
+    if include_nominal:
+        solar_scenarios = np.vstack([solar_production, solar_scenarios])
+        consumption_scenarios = np.vstack([consumption, consumption_scenarios])
+    return solar_scenarios, consumption_scenarios
+
+
+class ScenarioMPC(SmartGridMPC):
+    """
+    Two-stage stochastic MPC over an ensemble of solar production and consumption forecasts.
+
+    Every scenario gets its own copy of the SmartGridMPC linear program, and the copies are stacked into one
+    block-diagonal sparse LP that minimizes the expected cost. Non-anticipativity rows force the battery actions
+    of the first shared_steps (the steps that are applied before the next solve) to be equal in all scenarios,
+    the later battery actions and all grid actions are per-scenario recourse. When some scenario cannot share the
+    first actions, the controller plans on the given forecast alone and the telemetry record has 'fallback' set.
+    """
+
+    def __init__(self, battery, ampacity, horizon=24, n_scenario=10, shared_steps=1,
+                 solar_error=0.2, consumption_error=0.1, correlation=0.9, seed=None, use_battery=True, dt=1.0,
+                 degradation_cost=0.0, terminal_soc_value=0.0, telemetry_size=10000):
+        super().__init__(battery, ampacity, horizon=horizon, solver='linprog', use_battery=use_battery, dt=dt,
+                         degradation_cost=degradation_cost, terminal_soc_value=terminal_soc_value,
+                         telemetry_size=telemetry_size)
+        self.solver = 'scenario'
+        self.n_scenario = n_scenario
+        self.shared_steps = min(shared_steps, horizon)
+        self.solar_error = solar_error
+        self.consumption_error = consumption_error
+        self.correlation = correlation
+        self.rng = np.random.default_rng(seed)
+        self._fallback = False  # the last solve fell back to the given forecast
+        self._fallbacks = 0
+
+        self.scenarios = [MPCLinearProgram(battery, horizon, use_battery=self.use_battery, dt=dt,
+                                           degradation_cost=self.degradation_cost,
+                                           terminal_soc_value=self.terminal_soc_value)
+                          for _ in range(n_scenario)]
+        n_var = self.scenarios[0].n_var
+        H, S = horizon, self.shared_steps
+
+        # c_t^k - c_t^0 = 0 and d_t^k - d_t^0 = 0 for t < shared_steps and every scenario k > 0
+        rows = np.arange(2 * S * (n_scenario - 1))
+        step = np.tile(np.concatenate([np.arange(S), H + np.arange(S)]), n_scenario - 1)
+        scenario = np.repeat(np.arange(1, n_scenario), 2 * S)
+        non_anticipativity = sp.csr_matrix(
+            (np.concatenate([np.ones(len(rows)), -np.ones(len(rows))]),
+             (np.concatenate([rows, rows]), np.concatenate([scenario * n_var + step, step]))),
+            shape=(len(rows), n_scenario * n_var))
+        self.A_eq = sp.vstack([sp.block_diag([lp.A_eq for lp in self.scenarios]), non_anticipativity], format='csr')
+        self._b_non_anticipativity = np.zeros(len(rows))
+
+    def _optimize_linprog(self, buy_prices, sell_prices, solar_production, consumption):
+        """Solve the scenario LP, scenario 0 being the given forecast. Falls back to the deterministic solve."""
+        H, n_scenario = self.horizon, self.n_scenario
+        solar_scenarios, consumption_scenarios = forecast_scenarios(
+            solar_production, consumption, n_scenario, self.solar_error, self.consumption_error,
+            self.correlation, self.rng)
+
+        arbitrage = np.flatnonzero(np.asarray(sell_prices) > np.asarray(buy_prices))
+        buy_index = []
+        sell_index = []
+        charge_index = []
+        for k, lp in enumerate(self.scenarios):
+            max_buy_grid_power, max_sell_grid_power = self.grid_limits(solar_scenarios[k], consumption_scenarios[k])
+            lp.update(buy_prices, sell_prices, solar_scenarios[k], consumption_scenarios[k], self.battery.soc,
+                      max_buy_grid_power, max_sell_grid_power)
+            buy_index.append(k * lp.n_var + 2 * H + arbitrage)
+            sell_index.append(k * lp.n_var + 3 * H + arbitrage)
+            charge_index.append(k * lp.n_var + np.arange(H))
+
+        x, result = solve_lp(
+            np.concatenate([lp.cost for lp in self.scenarios]) / n_scenario,
+            self.A_eq,
+            np.concatenate([lp.b_eq for lp in self.scenarios] + [self._b_non_anticipativity]),
+            np.concatenate([lp.bounds for lp in self.scenarios]),
+            np.concatenate(buy_index),
+            np.concatenate(sell_index),
+            charge_index=np.concatenate(charge_index),
+            discharge_index=np.concatenate(charge_index) + H,
+        )
+
+        self._fallback = x is None
+        if x is None:
+            # Some scenario cannot share the first actions, plan on the given forecast alone
+            print(f"Scenario optimization failed: {result.message}, planning on the forecast alone")
+            return super()._optimize_linprog(buy_prices, sell_prices, solar_production, consumption)
+
+        # The plan of the nominal scenario, whose first shared_steps battery actions are common to all scenarios
+        return *self.scenarios[0].decode_solution(x[:self.scenarios[0].n_var]), result
+
+    def _record_telemetry(self, *args, **kwargs):
+        super()._record_telemetry(*args, **kwargs)
+        self.telemetry[-1]['fallback'] = self._fallback
+        self._fallbacks += self._fallback
+
+    def telemetry_summary(self):
+        """Aggregate statistics of all solves, with the number of fallbacks to the given forecast."""
+        return {**super().telemetry_summary(), 'fallbacks': self._fallbacks}
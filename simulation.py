@@ -0,0 +1,166 @@
+import dataclasses
+import numpy as np
+from battery_system import BatterySystem
+from smart_grid_mpc import SmartGridMPC
+from result_recorder import ResultRecorder
+from config import Config
+
+
+def steps_per_hour(dt):
+    """Number of time steps of dt hours in an hour. The step must divide the hour, e.g. 60, 30, 15 or 5 minutes."""
+    n = round(1 / dt)
+    if n < 1 or abs(n * dt - 1) > 1e-9:
+        raise ValueError(f'Time step of {dt * 60:g} minutes does not divide the hour')
+    return n
+
+
+def load_inputs(n_hour_pad, consumption_mode='base', start='2024-01-01', dt=1.0, tariff_file=None):
+    """
+    Build the price, solar production and consumption series for the simulation, one value per dt hours.
+
+    Prices come from tariff_file, by default the bundled tariff.
+    """
+    import pandas as pd
+    from price_forecast import PriceForecast
+    from solar_simulator import SolarProductionSimulator
+    from consumption_simulator import ConsumptionSimulator
+
+    times = pd.date_range(start, periods=n_hour_pad * steps_per_hour(dt), freq=pd.Timedelta(hours=dt))
+
+    price_forecast = PriceForecast(tariff_file)
+    solar_simulator = SolarProductionSimulator()
+    consumption_simulator = ConsumptionSimulator(mode=consumption_mode)
+    buy_prices, sell_prices = price_forecast.series(times)
+    solar_production = solar_simulator.series(times)
+    consumption = consumption_simulator.series(times)
+
+    return {
+        'dt': dt,
+        'times': times,
+        'buy_prices': buy_prices,
+        'sell_prices': sell_prices,
+        'solar_production': solar_production,
+        'consumption': consumption,
+    }
+
+
+def production_adjust(mode):
+    """Scale factor of the solar profile for a production mode."""
+    adjust = 16176.58 / 13983.73
+    if mode == 'low_prod':
+        adjust *= 0.9
+    elif mode == 'high_prod':
+        adjust *= 1.1
+    return adjust
+
+
+def make_battery(n_battery, cfg=None):
+    """Battery of n_battery units with the battery parameters of cfg (default Config())."""
+    cfg = cfg or Config()
+    capacity = n_battery * cfg.single_capacity  # kWh
+    charge_rate = capacity * cfg.c_rate
+    return BatterySystem(
+        capacity=capacity,  # kWh
+        max_charge_rate=charge_rate,  # kW
+        max_discharge_rate=charge_rate,  # kW
+        min_battery_level=cfg.min_battery_level,
+        efficiency=cfg.efficiency
+    )
+
+
+def run_simulation(inputs, cfg=None, n_hour=None, delta_hour=24, solver='linprog', cache=None, verbose=True,
+                   return_telemetry=False, forecast=None, **overrides):
+    """
+    Run the receding-horizon MPC simulation on precomputed inputs.
+
+    The run follows cfg (default Config()), with overrides replacing some of its fields, e.g. n_battery=1.
+    n_hour (default cfg.n_hour), cfg.horizon and delta_hour are in hours, the simulation runs in the time steps
+    of the inputs. By default the controller forecasts the actual future. With forecast, inputs with other solar
+    production and consumption, the controller plans on those instead and the grid covers the forecast error.
+    With cfg.n_scenario the controller is a ScenarioMPC over that many forecast scenarios, drawn with cfg.seed.
+
+    Returns:
+        pd.DataFrame: results per time step, and with return_telemetry a tuple of (results, telemetry, summary) where
+        telemetry has one row per MPC solve and summary aggregates them
+    """
+    cfg = dataclasses.replace(cfg or Config(), **overrides)
+    n_hour = cfg.n_hour if n_hour is None else n_hour
+    battery = make_battery(cfg.n_battery, cfg)
+
+    dt = inputs['dt']
+    n_per_hour = steps_per_hour(dt)
+    n_step, horizon, delta_step = n_hour * n_per_hour, cfg.horizon * n_per_hour, delta_hour * n_per_hour
+    n_solve = len(range(0, n_step, delta_step))  # the telemetry keeps a record of every solve of the run
+
+    if cfg.n_scenario:
+        from scenario_mpc import ScenarioMPC
+        mpc_controller = ScenarioMPC(battery, ampacity=cfg.ampacity, horizon=horizon, n_scenario=cfg.n_scenario,
+                                     shared_steps=delta_step, solar_error=cfg.solar_forecast_error,
+                                     consumption_error=cfg.consumption_forecast_error, seed=cfg.seed,
+                                     use_battery=cfg.use_battery, dt=dt, degradation_cost=cfg.degradation_cost,
+                                     terminal_soc_value=cfg.terminal_soc_value, telemetry_size=n_solve)
+    else:
+        mpc_controller = SmartGridMPC(battery, ampacity=cfg.ampacity, horizon=horizon, solver=solver,
+                                      warm_start=True, delta_hour=delta_step, use_battery=cfg.use_battery,
+                                      cache=cache, dt=dt, degradation_cost=cfg.degradation_cost,
+                                      terminal_soc_value=cfg.terminal_soc_value, telemetry_size=n_solve)
+
+    times = inputs['times']
+    buy_prices = inputs['buy_prices']
+    sell_prices = inputs['sell_prices']
+    solar_production = inputs['solar_production'] * production_adjust(cfg.mode)
+    consumption = inputs['consumption']
+    if forecast is None:
+        forecast_production, forecast_consumption = solar_production, consumption
+    else:
+        forecast_production = forecast['solar_production'] * production_adjust(cfg.mode)
+        forecast_consumption = forecast['consumption']
+
+    recorder = ResultRecorder(n_step, dt=dt)
+
+    # Simulate system operation
+    for t in range(0, n_step, delta_step):
+        if verbose and t % (24 * n_per_hour) == 0:
+            print(f'MPC for day {t // (24 * n_per_hour) + 1}, {times[t]}')
+        # Get predictions for the next horizon
+        buy_price_pred = buy_prices[t:t + horizon]
+        sell_price_pred = sell_prices[t:t + horizon]
+        production_pred = forecast_production[t:t + horizon]
+        consumption_pred = forecast_consumption[t:t + horizon]
+
+        # Pad predictions if needed
+        input_length = len(buy_price_pred)
+        if input_length < horizon:
+            print(f'Pad: input_length < horizon: {input_length} < {horizon}')
+            # Repeat the last value to fill the horizon
+            pad_width = (0, horizon - input_length)
+            buy_price_pred = np.pad(buy_price_pred, pad_width, 'edge')
+            sell_price_pred = np.pad(sell_price_pred, pad_width, 'edge')
+            production_pred = np.pad(production_pred, pad_width, 'edge')
+            consumption_pred = np.pad(consumption_pred, pad_width, 'edge')
+
+        # Get optimal actions
+        battery_action, grid_action = mpc_controller.optimize(
+            buy_price_pred,
+            sell_price_pred,
+            production_pred,
+            consumption_pred
+        )
+
+        # Store the next delta_hour of actions (or remaining hours if less than delta_hour)
+        steps_to_store = min(delta_step, n_step - t)
+        battery_socs = battery.apply(battery_action[:steps_to_store], dt=dt)
+        if forecast is not None:
+            # The grid balances the actual production and consumption
+            grid_action = (consumption[t:t + steps_to_store] + battery_action[:steps_to_store]
+                           - solar_production[t:t + steps_to_store])
+        recorder.record(t, battery_action, grid_action, battery_socs)
+
+    results = recorder.to_frame(times, buy_prices, sell_prices, solar_production, consumption)
+    if not return_telemetry:
+        return results
+
+    import pandas as pd
+    telemetry = pd.DataFrame(mpc_controller.telemetry)
+    telemetry.insert(0, 'time', times[0:n_step:delta_step])
+    return results, telemetry, mpc_controller.telemetry_summary()
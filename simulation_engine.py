@@ -0,0 +1,331 @@
+import argparse
+import csv
+import json
+import os
+from collections import deque
+import numpy as np
+import pandas as pd
+from price_forecast import PriceForecast
+from solar_simulator import SolarProductionSimulator
+from consumption_simulator import ConsumptionSimulator
+from smart_grid_mpc import SmartGridMPC
+from simulation import make_battery, production_adjust, steps_per_hour
+from config import Config
+
+columns = ['time', 'buy_price', 'sell_price', 'solar_production', 'consumption', 'battery_action', 'grid_action',
+           'battery_soc', 'buying_cost', 'selling_revenue', 'income', 'cum_income', 'consumption_cost',
+           'cum_consumption_cost', 'cum_solar_earn']
+
+
+def stream_inputs(start='2024-01-01', n_hour=None, mode='mid_prod', consumption_mode='base', chunk_hours=24 * 7,
+                  dt=1.0, tariff_file=None):
+    """
+    Yield the inputs of the simulation lazily, one chunk of hours at a time, every dt hours.
+
+    Yields:
+        dict with time, buy_price, sell_price, solar_production and consumption of one time step
+    """
+    price_forecast = PriceForecast(tariff_file)
+    solar_simulator = SolarProductionSimulator()
+    consumption_simulator = ConsumptionSimulator(mode=consumption_mode)
+    adjust = production_adjust(mode)
+
+    step = pd.Timedelta(hours=dt)
+    n_step = None if n_hour is None else int(round(n_hour * steps_per_hour(dt)))
+    chunk_steps = int(round(chunk_hours / dt))
+    chunk_start = pd.Timestamp(start)
+    produced = 0
+    while n_step is None or produced < n_step:
+        periods = chunk_steps if n_step is None else min(chunk_steps, n_step - produced)
+        times = pd.date_range(chunk_start, periods=periods, freq=step)
+        buy_prices, sell_prices = price_forecast.series(times)
+        solar_production = solar_simulator.series(times) * adjust
+        consumption = consumption_simulator.series(times)
+        for i, t in enumerate(times):
+            yield {
+                'time': t,
+                'buy_price': buy_prices[i],
+                'sell_price': sell_prices[i],
+                'solar_production': solar_production[i],
+                'consumption': consumption[i],
+            }
+        produced += periods
+        chunk_start = times[-1] + step
+
+
+class CSVSink:
+    """Appends records to a CSV file in the layout of the main.py output."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = None
+        self.writer = None
+
+    def open(self, offset=None, resuming=False):
+        """Open the file, truncating it to a checkpointed byte offset when resuming."""
+        if resuming and offset is None:
+            raise ValueError(f'Cannot resume {self.path} without a checkpointed offset')
+        if not resuming:
+            self.file = open(self.path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=columns)
+            self.writer.writeheader()
+        else:
+            self.file = open(self.path, 'r+', newline='', encoding='utf-8')
+            self.file.truncate(offset)
+            self.file.seek(offset)
+            self.writer = csv.DictWriter(self.file, fieldnames=columns)
+
+    def write(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class ParquetSink:
+    """
+    Writes records to a Parquet dataset directory, one complete part file per write. Requires pyarrow.
+
+    A part is written to a temporary file and renamed, so a crash never leaves a file without footer. The
+    checkpointed offset is the number of parts, on resume the parts after it are deleted. pd.read_parquet(path)
+    reads the parts in order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parts = 0
+
+    def _part_path(self, part):
+        return os.path.join(self.path, f'part-{part:05d}.parquet')
+
+    def open(self, offset=None, resuming=False):
+        if resuming and offset is None:
+            raise ValueError(f'Cannot resume {self.path} without a checkpointed part index')
+        os.makedirs(self.path, exist_ok=True)
+        self.parts = offset if resuming else 0
+        for name in os.listdir(self.path):
+            # Drop the parts written after the checkpoint, and every part of an earlier run when starting fresh
+            if name.startswith('part-') and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(self.path, name))
+
+    def write(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tmp_path = os.path.join(self.path, f'.part-{self.parts:05d}.tmp')
+        pq.write_table(pa.Table.from_pylist(records), tmp_path)
+        os.replace(tmp_path, self._part_path(self.parts))
+        self.parts += 1
+
+    def tell(self):
+        return self.parts
+
+    def close(self):
+        pass
+
+
+class CallbackSink:
+    """Passes every block of records to a callback."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def open(self, offset=None, resuming=False):
+        pass
+
+    def write(self, records):
+        self.callback(records)
+
+    def tell(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class SimulationEngine:
+    """
+    Step-wise receding-horizon simulation around SmartGridMPC and BatterySystem.
+
+    Inputs are pulled lazily from an iterator of per-step records (every controller.dt hours) and only one
+    horizon of them is kept in memory.
+    After every step the records are written to the sink and the state (position, battery SOC, cumulative
+    income and cost, sink offset) is saved to the checkpoint file, so an interrupted run can resume.
+    """
+
+    def __init__(self, controller, battery, sink=None, checkpoint_path=None, delta_hour=24):
+        self.controller = controller
+        self.battery = battery
+        self.horizon = controller.horizon  # time steps
+        self.dt = controller.dt  # hours per time step
+        self.delta_hour = delta_hour
+        self.delta_step = int(round(delta_hour / self.dt))
+        self.sink = sink
+        self.checkpoint_path = checkpoint_path
+
+        self.position = 0  # time steps simulated so far
+        self.cum_income = 0.0
+        self.cum_consumption_cost = 0.0
+        self._sink_offset = None
+        self._resuming = False
+
+    def save_checkpoint(self):
+        state = {
+            'position': self.position,
+            'soc': float(self.battery.soc),
+            'cum_income': self.cum_income,
+            'cum_consumption_cost': self.cum_consumption_cost,
+            'sink_offset': self.sink.tell() if self.sink is not None else None,
+        }
+        # Write to a temporary file first so that a crash never leaves a partial checkpoint
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def resume(self):
+        """
+        Restore the state of the checkpoint file.
+
+        Returns:
+            int: number of time steps already simulated, the input stream must start after them
+        """
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        self.position = state['position']
+        self.battery.soc = state['soc']
+        self.cum_income = state['cum_income']
+        self.cum_consumption_cost = state['cum_consumption_cost']
+        self._sink_offset = state['sink_offset']
+        self._resuming = True
+        return self.position
+
+    def _step_records(self, window, battery_actions, grid_actions, battery_socs):
+        records = []
+        for i, soc in enumerate(battery_socs):
+            inputs = window[i]
+            grid_action = grid_actions[i]
+            if grid_action > 0:  # Buy
+                buying_cost, selling_revenue = grid_action * inputs['buy_price'] * self.dt, 0.0
+            else:  # Sell
+                buying_cost, selling_revenue = 0.0, -grid_action * inputs['sell_price'] * self.dt
+            income = selling_revenue - buying_cost
+            consumption_cost = inputs['consumption'] * inputs['buy_price'] * self.dt
+            self.cum_income += income
+            self.cum_consumption_cost += consumption_cost
+            records.append({
+                **inputs,
+                'battery_action': battery_actions[i],
+                'grid_action': grid_action,
+                'battery_soc': soc,
+                'buying_cost': buying_cost,
+                'selling_revenue': selling_revenue,
+                'income': income,
+                'cum_income': self.cum_income,
+                'consumption_cost': consumption_cost,
+                'cum_consumption_cost': self.cum_consumption_cost,
+                'cum_solar_earn': self.cum_consumption_cost + self.cum_income,
+            })
+        return records
+
+    def run(self, stream, n_hour=None):
+        """
+        Simulate until the stream ends or n_hour hours (in total, including resumed ones) are simulated.
+
+        Yields:
+            list of the per-time-step records of each MPC step
+        """
+        n_step = None if n_hour is None else int(round(n_hour / self.dt))
+        stream = iter(stream)
+        window = deque()
+
+        def fill():
+            while len(window) < self.horizon:
+                inputs = next(stream, None)
+                if inputs is None:
+                    return
+                window.append(inputs)
+
+        if self.sink is not None:
+            self.sink.open(self._sink_offset, resuming=self._resuming)
+        try:
+            fill()
+            while window and (n_step is None or self.position < n_step):
+                predictions = {key: np.array([inputs[key] for inputs in window])
+                               for key in ('buy_price', 'sell_price', 'solar_production', 'consumption')}
+                if len(window) < self.horizon:
+                    # Repeat the last value to fill the horizon
+                    pad_width = (0, self.horizon - len(window))
+                    predictions = {key: np.pad(value, pad_width, 'edge') for key, value in predictions.items()}
+
+                battery_actions, grid_actions = self.controller.optimize(
+                    predictions['buy_price'],
+                    predictions['sell_price'],
+                    predictions['solar_production'],
+                    predictions['consumption']
+                )
+
+                steps = min(self.delta_step, len(window))
+                if n_step is not None:
+                    steps = min(steps, n_step - self.position)
+                battery_socs = self.battery.apply(battery_actions[:steps], dt=self.dt)
+                records = self._step_records(window, battery_actions, grid_actions, battery_socs)
+                for _ in range(steps):
+                    window.popleft()
+                self.position += steps
+
+                if self.sink is not None:
+                    self.sink.write(records)
+                if self.checkpoint_path is not None:
+                    self.save_checkpoint()
+                yield records
+                fill()
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+
+
+def main():
+    default = Config()
+    parser = argparse.ArgumentParser(description='Run the simulation step by step with checkpointing.')
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--n-day', type=int, default=default.n_day, help='number of days to simulate')
+    parser.add_argument('--delta-hour', type=int, default=24)
+    parser.add_argument('--step-minutes', type=int, default=default.step_minutes, help='time step, e.g. 60, 15 or 5')
+    parser.add_argument('--out', default=None, help='output .csv file or .parquet directory of part files')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file (default: <out>.checkpoint.json)')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint')
+    args = parser.parse_args()
+
+    cfg = Config(n_day=args.n_day, step_minutes=args.step_minutes)
+    capacity = cfg.capacity if cfg.use_battery else 0
+    out = args.out or f'data/output/{cfg.mode}/{cfg.mode}_{capacity}.csv'
+    checkpoint_path = args.checkpoint or f'{out}.checkpoint.json'
+    sink = ParquetSink(out) if out.endswith('.parquet') else CSVSink(out)
+
+    battery = make_battery(cfg.n_battery, cfg)
+    dt = cfg.dt
+    horizon = int(round(cfg.horizon / dt))
+    controller = SmartGridMPC(battery, ampacity=cfg.ampacity, horizon=horizon, warm_start=True,
+                              delta_hour=int(round(args.delta_hour / dt)), use_battery=cfg.use_battery, dt=dt,
+                              degradation_cost=cfg.degradation_cost, terminal_soc_value=cfg.terminal_soc_value)
+    engine = SimulationEngine(controller, battery, sink=sink, checkpoint_path=checkpoint_path,
+                              delta_hour=args.delta_hour)
+
+    position = engine.resume() * dt if args.resume else 0  # hours
+    # Inputs are streamed one horizon past the end so that the last steps see a full forecast
+    stream = stream_inputs(pd.Timestamp(args.start) + pd.Timedelta(hours=position),
+                           cfg.n_hour - position + cfg.horizon, mode=cfg.mode, consumption_mode=cfg.consumption_mode,
+                           dt=dt, tariff_file=cfg.tariff_file)
+    for records in engine.run(stream, n_hour=cfg.n_hour):
+        if records[0]['time'].hour == 0:
+            print(f"Simulated up to {records[-1]['time']}")
+
+
+if __name__ == '__main__':
+    main()
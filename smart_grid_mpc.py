@@ -1,13 +1,45 @@
+import time
+from collections import deque
 import numpy as np
-from scipy.optimize import minimize
-from config import use_battery
 
 
 class SmartGridMPC:
-    def __init__(self, battery, ampacity, horizon=24):
+    solvers = ('linprog', 'slsqp')
+
+    def __init__(self, battery, ampacity, horizon=24, solver='linprog', vectorized=True, warm_start=False,
+                 delta_hour=24, use_battery=True, cache=None, dt=1.0, degradation_cost=0.0, terminal_soc_value=0.0,
+                 telemetry_size=10000):
+        if solver not in self.solvers:
+            raise ValueError(f"Unknown solver '{solver}', expected one of {self.solvers}")
         self.battery = battery
         self.ampacity = ampacity
-        self.horizon = horizon
+        self.horizon = horizon  # number of time steps
+        self.dt = dt  # hours per time step
+        self.solver = solver
+        self.use_battery = use_battery
+        # $/kWh of battery throughput and $/kWh of SOC left at the end of the horizon
+        self.degradation_cost = degradation_cost
+        self.terminal_soc_value = terminal_soc_value
+        self.vectorized = vectorized  # SLSQP: NumPy constraints with analytic Jacobians instead of closures
+        self.warm_start = warm_start  # SLSQP: start from the previous solution shifted by delta_hour
+        self.delta_hour = delta_hour  # time steps between two solves
+        self.cache = cache  # optional SolutionCache shared between solves and controllers
+        self.telemetry = deque(maxlen=telemetry_size)  # one record for each of the last optimize() calls
+        # Running totals of all optimize() calls, which the bounded telemetry may no longer hold
+        self._totals = {'solves': 0, 'failures': 0, 'cache_hits': 0, 'wall_time': 0.0, 'max_wall_time': 0.0,
+                        'iterations': 0, 'iterated_solves': 0, 'max_violation': 0.0}
+
+        # Problem structure, built on the first solve and reused afterwards
+        self._lp = None
+        self._net_demand = np.zeros(horizon)
+        self._vectorized_constraints = None
+        self._lower_bounds = None
+        self._upper_bounds = None
+        self._previous_x = None
+
+    def reset(self):
+        """Forget the previous solution so that the next solve starts cold."""
+        self._previous_x = None
 
     def decode_actions(self, x):
         """Decode the optimization vector into battery and grid actions."""
@@ -20,28 +52,31 @@ class SmartGridMPC:
         Calculate the negative profit over the prediction horizon.
         We use negative profit because scipy.minimize minimizes the objective.
 
-        Profit = Revenue from selling - Cost of buying
+        Profit = Revenue from selling - Cost of buying - Battery degradation + Value of the final SOC
         """
         battery_actions, grid_actions = self.decode_actions(x)
 
-        total_profit = 0
-        soc = self.battery.soc
-
-        for t in range(self.horizon):
-            # Calculate profit from grid actions
-            if grid_actions[t] > 0:  # Buying (cost)
-                total_profit -= grid_actions[t] * buy_prices[t]
-            else:  # Selling (revenue)
-                total_profit -= grid_actions[t] * sell_prices[t]
-
-            # Update battery state
-            if battery_actions[t] > 0:  # Charging
-                soc += battery_actions[t] * self.battery.efficiency
-            else:  # Discharging
-                soc += battery_actions[t] / self.battery.efficiency
+        # Calculate profit from grid actions: buying (cost) and selling (revenue)
+        total_profit = -np.sum(grid_actions * np.where(grid_actions > 0, buy_prices, sell_prices)) * self.dt
+        if self.degradation_cost:
+            total_profit -= self.degradation_cost * np.sum(np.abs(battery_actions)) * self.dt
+        if self.terminal_soc_value:
+            total_profit += self.terminal_soc_value * self.soc_trajectory(x)[-1]
 
         return -total_profit  # Return negative profit for minimization
 
+    def objective_gradient(self, x, buy_prices, sell_prices, solar_production, consumption):
+        """Analytic gradient of objective_function (the sell price is used at zero grid action)."""
+        grad = np.zeros(2 * self.horizon)
+        battery_actions, grid_actions = self.decode_actions(x)
+        grad[self.horizon:] = np.where(grid_actions > 0, buy_prices, sell_prices) * self.dt
+        if self.degradation_cost:
+            grad[:self.horizon] += self.degradation_cost * np.sign(battery_actions) * self.dt
+        if self.terminal_soc_value:
+            slope = np.where(battery_actions > 0, self.battery.efficiency, 1 / self.battery.efficiency) * self.dt
+            grad[:self.horizon] -= self.terminal_soc_value * slope
+        return grad
+
     def constraints(self, x, solar_production, consumption):
         """Generate constraints for the optimization problem."""
         constraints = []
@@ -74,12 +109,66 @@ class SmartGridMPC:
 
         for i in range(t):
             if battery_actions[i] > 0:  # Charging
-                soc += battery_actions[i] * self.battery.efficiency
+                soc += battery_actions[i] * self.battery.efficiency * self.dt
             else:  # Discharging
-                soc += battery_actions[i] / self.battery.efficiency
+                soc += battery_actions[i] / self.battery.efficiency * self.dt
 
         return soc
 
+    def soc_trajectory(self, x):
+        """SOC after each step of the horizon as one cumulative sum."""
+        battery_actions = x[:self.horizon]
+        energy = np.where(battery_actions > 0, battery_actions * self.battery.efficiency,
+                          battery_actions / self.battery.efficiency) * self.dt
+        return self.battery.soc + np.cumsum(energy)
+
+    def vectorized_constraints(self, solar_production, consumption):
+        """Generate the constraints as three vector-valued functions with analytic Jacobians."""
+        if self._vectorized_constraints is None:
+            self._vectorized_constraints = self._build_vectorized_constraints()
+        np.subtract(consumption, solar_production, out=self._net_demand)
+        return self._vectorized_constraints
+
+    def _build_vectorized_constraints(self):
+        """Build the constraint functions once, they read the net demand of the current horizon in place."""
+        H = self.horizon
+        cumulative = np.tril(np.ones((H, H)))
+        net_demand = self._net_demand
+        balance_jac = np.hstack([np.eye(H), -np.eye(H)])
+
+        def soc_jac(x):
+            battery_actions = x[:H]
+            slope = np.where(battery_actions > 0, self.battery.efficiency, 1 / self.battery.efficiency) * self.dt
+            return np.hstack([cumulative * slope, np.zeros((H, H))])
+
+        return [
+            # SOC minimum constraint: SOC ≥ safe_level
+            {'type': 'ineq',
+             'fun': lambda x: self.soc_trajectory(x) - self.battery.safe_level,
+             'jac': soc_jac},
+            # SOC maximum constraint: SOC ≤ capacity
+            {'type': 'ineq',
+             'fun': lambda x: self.battery.capacity - self.soc_trajectory(x),
+             'jac': lambda x: -soc_jac(x)},
+            # Power balance constraint: consumption = solar_production - battery_charge + grid_buy
+            {'type': 'eq',
+             'fun': lambda x: net_demand + x[:H] - x[H:],
+             'jac': lambda x: balance_jac},
+        ]
+
+    def grid_limits(self, solar_production, consumption):
+        """Maximum grid power to buy and to sell over the horizon."""
+        if not self.use_battery:
+            # Without a battery the grid meets the net demand exactly, whatever battery is attached
+            net_demand = np.asarray(consumption) - np.asarray(solar_production)
+            return min(self.ampacity, max(net_demand.max(), 0)), min(self.ampacity, max(-net_demand.min(), 0))
+        # Grid bounds - assume we can buy/sell up to the maximum consumption
+        max_buy_grid_power = min(self.ampacity, np.mean(consumption) + self.battery.max_charge_rate)  # buy
+        max_sell_grid_power = min(self.ampacity, np.mean(solar_production) + self.battery.max_discharge_rate)  # sell
+        # max_buy_grid_power = min(self.ampacity, self.battery.max_charge_rate)  # buy
+        # max_sell_grid_power = min(self.ampacity, self.battery.max_discharge_rate)  # sell
+        return max_buy_grid_power, max_sell_grid_power
+
     def optimize(self, buy_prices, sell_prices, solar_production, consumption):
         """
         Optimize battery and grid actions over the prediction horizon.
@@ -87,35 +176,174 @@ class SmartGridMPC:
         Returns:
             Tuple of (battery_actions, grid_actions)
         """
-        # Initial guess: no battery action and grid meets net demandbound
+        self._build()  # Not timed, so that the telemetry of the first solve is comparable to the others
+        start = time.perf_counter()
+        if self.cache is not None:
+            key = self.cache.key(self, buy_prices, sell_prices, solar_production, consumption)
+            cached = self.cache.get(key)
+            if cached is not None:
+                battery_actions, grid_actions, status = cached
+                self._previous_x = np.concatenate([battery_actions, grid_actions])
+                self._record_telemetry(start, None, (battery_actions, grid_actions), buy_prices, sell_prices,
+                                       solar_production, consumption, status=status)
+                return battery_actions, grid_actions
+
+        if self.solver == 'slsqp':
+            battery_actions, grid_actions, result = self._optimize_slsqp(buy_prices, sell_prices, solar_production,
+                                                                         consumption)
+        else:
+            battery_actions, grid_actions, result = self._optimize_linprog(buy_prices, sell_prices,
+                                                                           solar_production, consumption)
+
+        if self.cache is not None and result.status == 0:
+            # Failed solves fall back to no battery action, which must not be served again
+            self.cache.put(key, battery_actions, grid_actions, status=result.status)
+        self._record_telemetry(start, result, (battery_actions, grid_actions), buy_prices, sell_prices,
+                               solar_production, consumption, status=result.status)
+        return battery_actions, grid_actions
+
+    def max_constraint_violation(self, battery_actions, grid_actions, solar_production, consumption):
+        """Largest violation of the power balance, SOC bounds and action bounds by a pair of action vectors."""
+        max_buy_grid_power, max_sell_grid_power = self.grid_limits(solar_production, consumption)
+        if self.use_battery:
+            max_charge_rate, max_discharge_rate = self.battery.max_charge_rate, self.battery.max_discharge_rate
+        else:
+            max_charge_rate, max_discharge_rate = 0, 0
+        soc = self.soc_trajectory(battery_actions)
+        violations = [
+            np.abs(consumption - (solar_production - battery_actions + grid_actions)),
+            self.battery.safe_level - soc,
+            soc - self.battery.capacity,
+            battery_actions - max_charge_rate,
+            -max_discharge_rate - battery_actions,
+            grid_actions - max_buy_grid_power,
+            -max_sell_grid_power - grid_actions,
+        ]
+        return max(0.0, float(np.max(violations)))
+
+    def _record_telemetry(self, start, result, solution, buy_prices, sell_prices, solar_production, consumption,
+                          status=None):
+        """
+        Store wall time, solver statistics, objective and feasibility of one optimize() call.
+        result is None on a cache hit, status is the solver status of the solve or of the cached solve.
+        """
+        wall_time = time.perf_counter() - start
+        battery_actions, grid_actions = solution
+        record = {
+            'solver': self.solver,
+            'wall_time': wall_time,
+            'cache_hit': result is None,
+            'status': status,
+            'success': status == 0,
+            'iterations': getattr(result, 'nit', None),
+            'nfev': getattr(result, 'nfev', None),
+            'objective': float(self.objective_function(np.concatenate(solution), buy_prices, sell_prices,
+                                                       solar_production, consumption)),
+            'max_violation': self.max_constraint_violation(battery_actions, grid_actions, solar_production,
+                                                           consumption),
+        }
+        self.telemetry.append(record)
+
+        totals = self._totals
+        totals['solves'] += 1
+        totals['failures'] += not record['success']
+        totals['cache_hits'] += record['cache_hit']
+        totals['wall_time'] += wall_time
+        totals['max_wall_time'] = max(totals['max_wall_time'], wall_time)
+        if record['iterations'] is not None:
+            totals['iterations'] += record['iterations']
+            totals['iterated_solves'] += 1
+        totals['max_violation'] = max(totals['max_violation'], record['max_violation'])
+
+    def telemetry_summary(self):
+        """Aggregate statistics of all solves, the p95 wall time is the one of the solves kept in telemetry."""
+        totals = self._totals
+        if not totals['solves']:
+            return {'solves': 0}
+        return {
+            'solves': totals['solves'],
+            'failures': totals['failures'],
+            'cache_hits': totals['cache_hits'],
+            'total_wall_time': totals['wall_time'],
+            'mean_wall_time': totals['wall_time'] / totals['solves'],
+            'p95_wall_time': float(np.percentile([record['wall_time'] for record in self.telemetry], 95)),
+            'max_wall_time': totals['max_wall_time'],
+            'mean_iterations': totals['iterations'] / totals['iterated_solves'] if totals['iterated_solves'] else None,
+            'max_violation': totals['max_violation'],
+        }
+
+    def _build(self):
+        """Import scipy and build the linear program on the first solve."""
+        if self.solver == 'slsqp':
+            import scipy.optimize  # noqa: F401
+        elif self._lp is None:
+            from linear_program import MPCLinearProgram
+            self._lp = MPCLinearProgram(self.battery, self.horizon, use_battery=self.use_battery, dt=self.dt,
+                                        degradation_cost=self.degradation_cost,
+                                        terminal_soc_value=self.terminal_soc_value)
+
+    def _optimize_linprog(self, buy_prices, sell_prices, solar_production, consumption):
+        """Solve the horizon exactly as a sparse linear program with HiGHS."""
+        max_buy_grid_power, max_sell_grid_power = self.grid_limits(solar_production, consumption)
+        x, result = self._lp.solve(buy_prices, sell_prices, solar_production, consumption, self.battery.soc,
+                                   max_buy_grid_power, max_sell_grid_power)
+
+        if x is None:
+            print(f"Optimization failed: {result.message}")
+            # Fall back to no battery action, the grid meets net demand
+            return np.zeros(self.horizon), np.asarray(consumption - solar_production, dtype=float), result
+
+        return *self._lp.decode_solution(x), result
+
+    def initial_guess(self, solar_production, consumption):
+        """Cold start from no battery action, or warm start from the previous solution shifted by delta_hour."""
         x0 = np.zeros(2 * self.horizon)  # [battery_actions, grid_actions]
+        if self.warm_start and self._previous_x is not None and self.delta_hour < self.horizon:
+            # Keep the remaining planned battery actions, and repeat the last one to fill the horizon
+            previous_battery_actions = self._previous_x[self.delta_hour:self.horizon]
+            x0[:len(previous_battery_actions)] = previous_battery_actions
+            x0[len(previous_battery_actions):self.horizon] = previous_battery_actions[-1]
+            x0[:self.horizon] = np.clip(x0[:self.horizon], self._lower_bounds[:self.horizon],
+                                        self._upper_bounds[:self.horizon])
 
         # Set initial grid actions to meet net demand
-        x0[self.horizon:] = consumption - solar_production
+        x0[self.horizon:] = consumption - solar_production + x0[:self.horizon]
+        return x0
+
+    def _optimize_slsqp(self, buy_prices, sell_prices, solar_production, consumption):
+        """Solve the horizon with SLSQP on the original nonlinear formulation."""
+        from scipy.optimize import minimize, Bounds
 
         # Bounds for actions
-        if use_battery:
-            battery_action_bounds = [(-self.battery.max_discharge_rate, self.battery.max_charge_rate) for _ in
-                                     range(self.horizon)]
-        else:
-            battery_action_bounds = [(0, 0) for _ in range(self.horizon)]
+        if self._lower_bounds is None:
+            self._lower_bounds = np.zeros(2 * self.horizon)
+            self._upper_bounds = np.zeros(2 * self.horizon)
+            if self.use_battery:
+                self._lower_bounds[:self.horizon] = -self.battery.max_discharge_rate
+                self._upper_bounds[:self.horizon] = self.battery.max_charge_rate
 
-        # Grid bounds - assume we can buy/sell up to the maximum consumption
-        max_buy_grid_power = min(self.ampacity, np.mean(consumption) + self.battery.max_charge_rate)  # buy
-        max_sell_grid_power = min(self.ampacity, np.mean(solar_production) + self.battery.max_discharge_rate)  # sell
-        # max_buy_grid_power = min(self.ampacity, self.battery.max_charge_rate)  # buy
-        # max_sell_grid_power = min(self.ampacity, self.battery.max_discharge_rate)  # sell
-        grid_action_bounds = [(-max_sell_grid_power, max_buy_grid_power) for _ in range(self.horizon)]
+        max_buy_grid_power, max_sell_grid_power = self.grid_limits(solar_production, consumption)
+        self._lower_bounds[self.horizon:] = -max_sell_grid_power
+        self._upper_bounds[self.horizon:] = max_buy_grid_power
+        bounds = Bounds(self._lower_bounds, self._upper_bounds)
+
+        x0 = self.initial_guess(solar_production, consumption)
 
-        bounds = battery_action_bounds + grid_action_bounds
+        if self.vectorized:
+            constraints = self.vectorized_constraints(solar_production, consumption)
+            jac = self.objective_gradient
+        else:
+            constraints = self.constraints(x0, solar_production, consumption)
+            jac = None
 
         # Optimize
         result = minimize(
             fun=self.objective_function,
             x0=x0,
             args=(buy_prices, sell_prices, solar_production, consumption),
+            jac=jac,
             bounds=bounds,
-            constraints=self.constraints(x0, solar_production, consumption),
+            constraints=constraints,
             method='SLSQP',
             options={'maxiter': 500}
         )
@@ -123,4 +351,5 @@ class SmartGridMPC:
         if not result.success:
             print(f"Optimization failed: {result.message}")
 
-        return self.decode_actions(result.x)
+        self._previous_x = result.x
+        return *self.decode_actions(result.x), result
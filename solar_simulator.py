@@ -1,14 +1,27 @@
 # Data source: https://pvwatts.nrel.gov/pvwatts.php
 import numpy as np
 import pandas as pd
+from profile_cache import load_profile, profile_series, profile_table
+
+source = 'data/input/solar_production_SD.csv'
 
 
 class SolarProductionSimulator:
-    def __init__(self, peak_production: float = 6.48):  # peak_production = 6.48 makes daily prod = 45 kWh
+    def __init__(self, peak_production: float = 6.48, use_cache=True):  # 6.48 makes daily prod = 45 kWh
         self.peak_production = peak_production
-        solar_data = pd.read_csv('data/input/solar_production_SD.csv')
-        solar_data['mdh'] = solar_data.apply(lambda r: (r['Month'], r['Day'], r['Hour']), axis=1)
-        self.mdh_prod = dict(zip(solar_data['mdh'], solar_data['AC System Output (W)'] / 1000))
+        # Production in kW indexed by month 1-12, day 1-31 and hour 0-23, valid where the data has the hour
+        self.mdh_prod, self.mdh_valid = load_profile(source, self.load_table, use_cache=use_cache)
+        self._table = None
+
+    def load_table(self):
+        """Parse the solar CSV into the (month, day, hour) table and its validity mask."""
+        solar_data = pd.read_csv(source, usecols=['Month', 'Day', 'Hour', 'AC System Output (W)'])
+        month, day, hour = solar_data['Month'].values, solar_data['Day'].values, solar_data['Hour'].values
+        mdh_prod = np.zeros((13, 32, 24))
+        mdh_valid = np.zeros((13, 32, 24), dtype=bool)
+        mdh_prod[month, day, hour] = solar_data['AC System Output (W)'].values / 1000
+        mdh_valid[month, day, hour] = True
+        return mdh_prod, mdh_valid
 
     def simulate(self, month: int, day: int, hour: int) -> float:
         """
@@ -23,8 +36,8 @@ class SolarProductionSimulator:
             float: Solar production in kW
         """
 
-        if (month, day, hour) in self.mdh_prod:
-            base_production = self.mdh_prod[(month, day, hour)]
+        if self.mdh_valid[month, day, hour]:
+            base_production = self.mdh_prod[month, day, hour]
             return base_production
 
         if month == 2 and day == 29:
@@ -37,3 +50,25 @@ class SolarProductionSimulator:
             production = self.peak_production * np.exp(-(hour_offset ** 2) / 16)
             return max(0, production)
         return 0.0
+
+    def _fallback(self, hour):
+        """Bell curve production for an array of hours."""
+        production = self.peak_production * np.exp(-((hour - 12) ** 2) / 16)
+        return np.where((6 <= hour) & (hour <= 18), np.maximum(0, production), 0.0)
+
+    def _lookup_table(self):
+        """(month, day, hour) table of simulate(), indexed by month 1-12, day 1-31 and hour 0-23."""
+        if self._table is None:
+            self._table = profile_table(self.mdh_prod, self.mdh_valid, self._fallback)
+        return self._table
+
+    def series(self, times):
+        """
+        Solar production in kW for every timestamp of a DatetimeIndex.
+
+        Timestamps between two hours are linearly interpolated between the hourly values.
+
+        Returns:
+            np.ndarray: same values as simulate() for timestamps on the hour
+        """
+        return profile_series(self._lookup_table(), times)
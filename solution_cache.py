@@ -0,0 +1,77 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+
+class SolutionCache:
+    """
+    Bounded LRU cache of MPC solutions.
+
+    Problems are keyed on a fingerprint of the forecasts, the initial SOC and the battery and grid parameters,
+    each quantized to `decimals` decimal places, so that problems equal up to rounding share one solution.
+    Problems without a battery do not depend on the SOC or the battery, so those are left out of their key.
+    One cache can be shared by several controllers, e.g. all runs of a sweep worker.
+
+    Only solutions of successful solves are stored, together with the solver status.
+
+    Hits need the same forecasts and SOC. With the bundled profiles no two days are alike, and configurations
+    differ in production, battery or SOC trajectory, so a sweep of distinct configurations rarely hits (12 of
+    4392 year-long solves in a 3 x 3 x 2 sweep, all on the Feb 29 copy of Feb 28). The cache pays off when the
+    same configuration is simulated again, e.g. repeated sweeps or evaluations in one worker.
+    """
+
+    def __init__(self, maxsize=4096, decimals=6):
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._solutions = OrderedDict()
+
+    def __len__(self):
+        return len(self._solutions)
+
+    def key(self, controller, buy_prices, sell_prices, solar_production, consumption):
+        """Fingerprint of one MPC problem."""
+        battery = controller.battery
+        if controller.use_battery:
+            parameters = [battery.soc, battery.capacity, battery.safe_level, battery.max_charge_rate,
+                          battery.max_discharge_rate, battery.efficiency, controller.ampacity]
+        else:
+            parameters = [controller.ampacity]
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{controller.solver}|{controller.use_battery}|{controller.horizon}|{controller.dt}|'
+                      f'{controller.degradation_cost}|{controller.terminal_soc_value}'.encode())
+        for values in (buy_prices, sell_prices, solar_production, consumption, parameters):
+            quantized = np.round(np.asarray(values, dtype=float) * 10 ** self.decimals).astype(np.int64)
+            digest.update(quantized.tobytes())
+        return digest.digest()
+
+    def get(self, key):
+        """Cached (battery_actions, grid_actions, status) of a problem, None on a miss."""
+        solution = self._solutions.get(key)
+        if solution is None:
+            self.misses += 1
+            return None
+        self._solutions.move_to_end(key)
+        self.hits += 1
+        return solution[0].copy(), solution[1].copy(), solution[2]
+
+    def put(self, key, battery_actions, grid_actions, status=0):
+        self._solutions[key] = (np.array(battery_actions, dtype=float), np.array(grid_actions, dtype=float), status)
+        self._solutions.move_to_end(key)
+        if len(self._solutions) > self.maxsize:
+            self._solutions.popitem(last=False)
+
+    def clear(self):
+        self._solutions.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self), 'maxsize': self.maxsize,
+                'hit_rate': self.hit_rate}
@@ -0,0 +1,136 @@
+import argparse
+import dataclasses
+import itertools
+import os
+import time
+from multiprocessing import Pool
+import pandas as pd
+from simulation import load_inputs, run_simulation
+from validation import validate_results
+from solution_cache import SolutionCache
+from result_store import write_results, resolve_format, formats
+from config import Config
+
+# Inputs shared by the worker processes and the MPC solution cache of each worker, set by _init_worker
+_inputs = None
+_cache = None
+
+
+def make_grid(modes=('mid_prod',), use_batteries=(True,), n_batteries=(2,), consumption_modes=('base',)):
+    """
+    Expand the configuration grid into a list of run configurations, each a dict of Config fields.
+
+    Runs without a battery do not depend on n_battery, so they appear once per mode and consumption mode,
+    with n_battery 0.
+    """
+    configs = []
+    for mode, use_battery, n_battery, consumption_mode in itertools.product(modes, use_batteries, n_batteries,
+                                                                            consumption_modes):
+        run_config = {'mode': mode, 'consumption_mode': consumption_mode, 'use_battery': bool(use_battery),
+                      'n_battery': n_battery if use_battery else 0}
+        if run_config not in configs:
+            configs.append(run_config)
+    return configs
+
+
+def summarize(results, dt=1.0):
+    """Summary metrics of one simulation run with dt hours per step, energies in kWh."""
+    return {
+        'total_production': results['solar_production'].sum() * dt,
+        'total_consumption': results['consumption'].sum() * dt,
+        'buying_cost': results['buying_cost'].sum(),
+        'selling_revenue': results['selling_revenue'].sum(),
+        'net_income': results['income'].sum(),
+        'consumption_cost': results['consumption_cost'].sum(),
+        'solar_earn': results['cum_solar_earn'].iloc[-1],
+    }
+
+
+def _init_worker(inputs, cache_size):
+    global _inputs, _cache
+    _inputs = inputs
+    _cache = SolutionCache(maxsize=cache_size) if cache_size > 0 else None
+
+
+def _run_config(run_config, cfg, n_hour, delta_hour, output_dir, output_format):
+    cfg = dataclasses.replace(cfg, **run_config)
+    start = time.perf_counter()
+    hits = _cache.hits if _cache is not None else 0
+    results = run_simulation(_inputs[cfg.consumption_mode], cfg, n_hour=n_hour, delta_hour=delta_hour, cache=_cache,
+                             verbose=False)
+    elapsed = time.perf_counter() - start
+    cache_hits = _cache.hits - hits if _cache is not None else 0
+
+    capacity = cfg.capacity if cfg.use_battery else 0
+    if output_dir is not None and output_format != 'csv':
+        write_results(results, output_dir, cfg.mode, capacity, cfg.consumption_mode, format=output_format)
+    elif output_dir is not None:
+        dir = f'{output_dir}/{cfg.consumption_mode}/{cfg.mode}'
+        os.makedirs(dir, exist_ok=True)
+        results.to_csv(f'{dir}/{cfg.mode}_{capacity}.csv', encoding='utf-8', index=False)
+
+    report = validate_results(results, cfg)
+    validity = {f'{check}_violations': report.count(check) for check in report.violations}
+    return {**run_config, 'capacity': capacity, **summarize(results, cfg.dt), 'valid': report.ok, **validity,
+            'cache_hits': cache_hits, 'elapsed': elapsed}
+
+
+def run_sweep(configs, cfg=None, n_hour=None, delta_hour=24, processes=None, output_dir=None, cache_size=4096):
+    """
+    Run one simulation per configuration in a process pool.
+
+    Every configuration overrides its fields of cfg (default Config()), which holds the shared settings like the
+    horizon, time step and output format. n_hour defaults to cfg.n_hour.
+
+    The input series are built once per consumption mode in the parent process and shared with the workers.
+    Each worker keeps a SolutionCache of cache_size MPC solutions across its runs (0 disables it).
+
+    Returns:
+        pd.DataFrame: one row of summary metrics per configuration
+    """
+    cfg = cfg or Config()
+    n_hour = cfg.n_hour if n_hour is None else n_hour
+    consumption_modes = sorted({run_config['consumption_mode'] for run_config in configs})
+    inputs = {consumption_mode: load_inputs(n_hour + cfg.horizon, consumption_mode=consumption_mode, dt=cfg.dt,
+                                            tariff_file=cfg.tariff_file)
+              for consumption_mode in consumption_modes}
+
+    output_format = resolve_format(cfg.output_format) if output_dir is not None else cfg.output_format
+    tasks = [(run_config, cfg, n_hour, delta_hour, output_dir, output_format) for run_config in configs]
+    with Pool(processes=processes, initializer=_init_worker, initargs=(inputs, cache_size)) as pool:
+        rows = pool.starmap(_run_config, tasks, chunksize=1)
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    default = Config()
+    parser = argparse.ArgumentParser(description='Run the smart grid simulation over a grid of configurations.')
+    parser.add_argument('--mode', nargs='+', default=[default.mode],
+                        choices=['low_prod', 'mid_prod', 'high_prod'])
+    parser.add_argument('--use-battery', nargs='+', type=int, default=[int(default.use_battery)], choices=[0, 1])
+    parser.add_argument('--n-battery', nargs='+', type=int, default=[default.n_battery])
+    parser.add_argument('--consumption-mode', nargs='+', default=[default.consumption_mode])
+    parser.add_argument('--n-day', type=int, default=default.n_day, help='number of days to simulate')
+    parser.add_argument('--delta-hour', type=int, default=24)
+    parser.add_argument('--step-minutes', type=int, default=default.step_minutes, help='time step, e.g. 60, 15 or 5')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--cache-size', type=int, default=4096, help='MPC solutions cached per worker, 0 disables')
+    parser.add_argument('--output-dir', default=None, help='also write the hourly results of every run')
+    parser.add_argument('--output-format', default=default.output_format, choices=formats)
+    parser.add_argument('--out', default='data/output/sweep.csv', help='summary table')
+    args = parser.parse_args()
+
+    configs = make_grid(args.mode, args.use_battery, args.n_battery, args.consumption_mode)
+    print(f'Running {len(configs)} configurations')
+    cfg = dataclasses.replace(default, n_day=args.n_day, step_minutes=args.step_minutes,
+                              output_format=args.output_format)
+    summary = run_sweep(configs, cfg, delta_hour=args.delta_hour, processes=args.processes,
+                        output_dir=args.output_dir, cache_size=args.cache_size)
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    summary.to_csv(args.out, encoding='utf-8', index=False)
+    print(summary.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
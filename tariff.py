@@ -0,0 +1,128 @@
+import copy
+import json
+from datetime import date
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import AbstractHolidayCalendar, USFederalHolidayCalendar
+
+tariff_dir = 'data/tariff'
+default_tariff = f'{tariff_dir}/sdge_tou_dr1.json'
+
+day_types = ('weekday', 'weekend', 'holiday')
+months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+class Tariff:
+    """
+    Buy and sell rates of a tariff file, compiled into hourly price arrays.
+
+    A tariff file (see data/tariff/sdge_tou_dr1.json) defines:
+        periods: per day type, the [start_hour, period] changes of the TOU periods over the day
+        buy_rates: seasons, each with its months and the rate of every period per day type
+        holidays: pandas US federal holiday rule names and extra dates, priced as day_type (default weekend)
+        sell_prices: 24 hourly export prices per month
+
+    The rates are first expanded into (month, day type, hour) tables. compile() turns them into one price per
+    hour of a date range, after which a lookup is a single integer index into the compiled arrays.
+    """
+
+    def __init__(self, definition):
+        definition = copy.deepcopy(definition)  # the defaults below must not leak into the caller's definition
+        self.name = definition.get('name')
+        periods = definition['periods']
+        periods.setdefault('holiday', periods['weekend'])
+
+        self.period_names = sorted({period for changes in periods.values() for _, period in changes})
+        self.period_table = np.zeros((len(day_types), 24), dtype=int)  # (day type, hour) -> period index
+        for d, day_type in enumerate(day_types):
+            for start_hour, period in periods[day_type]:
+                self.period_table[d, start_hour:] = self.period_names.index(period)
+
+        self.buy_table = np.full((12, len(day_types), 24), np.nan)  # (month, day type, hour) -> $/kWh
+        for season in definition['buy_rates']:
+            for d, day_type in enumerate(day_types):
+                rates = season.get(day_type, season['weekend'] if day_type == 'holiday' else None)
+                period_rates = np.array([rates[period] if period in rates else np.nan for period in self.period_names])
+                for month in season['months']:
+                    self.buy_table[month - 1, d] = period_rates[self.period_table[d]]
+        if np.isnan(self.buy_table).any():
+            raise ValueError(f"Tariff '{self.name}' does not define a buy rate for every month, day type and hour")
+
+        self.sell_table = np.array([definition['sell_prices'][month] for month in months], dtype=float)  # (12, 24)
+
+        holidays = definition.get('holidays', {})
+        rules = [rule for rule in USFederalHolidayCalendar.rules if rule.name in holidays.get('rules', [])]
+        self.holiday_calendar = AbstractHolidayCalendar(rules=rules)
+        self.holiday_dates = pd.DatetimeIndex(holidays.get('dates', []))
+        self.holiday_day_type = day_types.index(holidays.get('day_type', 'holiday'))
+
+        self._compiled = None
+        self._buy_rates = self.buy_table.tolist()  # nested lists for fast scalar lookups
+        self._holiday_years = {}  # year -> set of holiday dates
+
+    @classmethod
+    def from_file(cls, path=default_tariff):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def day_types(self, days):
+        """Day type index (0 weekday, 1 weekend, 2 holiday rates) of every day of a DatetimeIndex of midnights."""
+        day_type = (np.asarray(days.dayofweek) >= 5).astype(int)  # 0 = Monday, 6 = Sunday
+        holidays = self.holiday_calendar.holidays(days.min(), days.max()).union(self.holiday_dates)
+        day_type[np.asarray(days.isin(holidays))] = self.holiday_day_type
+        return day_type
+
+    def buy_price(self, year, month, day, hour):
+        """Buy price of one hour, from the rate tables without building any pandas objects."""
+        current_date = date(year, month, day)
+        holidays = self._holiday_years.get(year)
+        if holidays is None:
+            days = self.holiday_calendar.holidays(pd.Timestamp(year, 1, 1), pd.Timestamp(year, 12, 31))
+            holidays = self._holiday_years[year] = {day.date() for day in days.union(self.holiday_dates)}
+        if current_date in holidays:
+            day_type = self.holiday_day_type
+        else:
+            day_type = int(current_date.weekday() >= 5)  # 0 = Monday, 6 = Sunday
+        return self._buy_rates[month - 1][day_type][hour]
+
+    def compile(self, start, end):
+        """
+        Precompute the buy price, sell price and TOU period of every hour from start to end (whole days).
+
+        Returns:
+            dict with start (first midnight), buy_prices, sell_prices and periods, one value per hour
+        """
+        days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+        month = np.asarray(days.month) - 1
+        day_type = self.day_types(days)
+        self._compiled = {
+            'start': days[0],
+            'end': days[-1] + pd.Timedelta(days=1),
+            'buy_prices': self.buy_table[month, day_type].ravel(),
+            'sell_prices': self.sell_table[month].ravel(),
+            'periods': self.period_table[day_type].ravel(),
+        }
+        return self._compiled
+
+    def _index(self, times):
+        times = pd.DatetimeIndex(times)
+        compiled = self._compiled
+        if compiled is None or times.min() < compiled['start'] or times.max() >= compiled['end']:
+            # Compile whole years, so that consecutive chunks of a simulation reuse the arrays
+            compiled = self.compile(pd.Timestamp(times.min().year, 1, 1), pd.Timestamp(times.max().year, 12, 31))
+        return compiled, np.asarray((times - compiled['start']) // pd.Timedelta(hours=1))
+
+    def prices(self, times):
+        """
+        Buy and sell prices at every timestamp, compiling the covered date range on first use.
+
+        Returns:
+            Tuple of (buy_prices, sell_prices)
+        """
+        compiled, index = self._index(times)
+        return compiled['buy_prices'][index], compiled['sell_prices'][index]
+
+    def periods(self, times):
+        """TOU period name at every timestamp."""
+        compiled, index = self._index(times)
+        return np.array(self.period_names)[compiled['periods'][index]]
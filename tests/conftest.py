@@ -0,0 +1,33 @@
+import os
+import sys
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """The modules read data/ relative to the repository root, as when run as scripts."""
+    monkeypatch.chdir(root)
+
+
+@pytest.fixture(scope='session')
+def inputs():
+    """Hourly inputs of the first 30 days of 2024 plus one horizon."""
+    os.chdir(root)
+    from simulation import load_inputs
+    return load_inputs(30 * 24 + 24)
+
+
+@pytest.fixture
+def window(inputs):
+    """Slices the (buy_prices, sell_prices, solar_production, consumption) forecast of horizon steps from start."""
+    from simulation import production_adjust
+
+    def window(start=0, horizon=24, inputs=inputs):
+        steps = slice(start, start + horizon)
+        return (inputs['buy_prices'][steps], inputs['sell_prices'][steps],
+                inputs['solar_production'][steps] * production_adjust('mid_prod'), inputs['consumption'][steps])
+
+    return window
@@ -0,0 +1,98 @@
+import asyncio
+import copy
+import time
+import numpy as np
+import pandas as pd
+from control_service import ControlService
+from simulation import make_battery
+
+interval = 0.2  # seconds between two measurements
+latency_budget = 0.05
+slow = 0.12  # misses the latency budget, but finishes before the next measurement
+
+
+class ListSource:
+    def __init__(self, n):
+        self.n = n
+
+    async def __aiter__(self):
+        for t in pd.date_range('2024-01-01', periods=self.n, freq='h'):
+            yield {'time': t, 'solar_production': 0.0, 'consumption': 1.0}
+            await asyncio.sleep(interval)
+
+
+class ZeroForecaster:
+    def forecast(self, measurement, horizon):
+        return (np.zeros(horizon),) * 4
+
+
+class FakeController:
+    """Plans solve + 0.01 * step for the n-th solve (0 is the warm-up), taking delays[n] seconds or failing."""
+
+    def __init__(self, battery, delays=None, failures=(), horizon=24):
+        self.battery = battery
+        self.horizon = horizon
+        self.dt = 1.0
+        self.delays = delays or {}
+        self.failures = failures
+        self.solves = 0
+
+    def optimize(self, buy_prices, sell_prices, solar_production, consumption):
+        solve = self.solves
+        self.solves += 1
+        time.sleep(self.delays.get(solve, 0))
+        if solve in self.failures:
+            raise RuntimeError(f'solve {solve} failed')
+        return solve + 0.01 * np.arange(self.horizon), np.zeros(self.horizon)
+
+
+def run_service(n, replan_steps=1, history_size=10000, **kwargs):
+    battery = make_battery(2)
+    controller = FakeController(copy.copy(battery), **kwargs)
+    service = ControlService(controller, battery, ListSource(n), ZeroForecaster(), replan_steps=replan_steps,
+                             latency_budget=latency_budget, history_size=history_size)
+    setpoints = asyncio.run(service.run())
+    return service, [(setpoint['origin'], setpoint['fallback'], round(setpoint['battery_action'], 2))
+                     for setpoint in setpoints]
+
+
+def test_scheduled_steps_shift_the_last_plan():
+    service, setpoints = run_service(6, replan_steps=3)
+    assert setpoints == [('plan', None, 1.0), ('schedule', None, 1.01), ('schedule', None, 1.02),
+                         ('plan', None, 2.0), ('schedule', None, 2.01), ('schedule', None, 2.02)]
+    summary = service.latency_summary()
+    assert summary['fallbacks'] == 0 and summary['deadline_misses'] == 0
+
+
+def test_deadline_miss_falls_back_to_the_last_plan():
+    service, setpoints = run_service(4, delays={2: 0.3})
+    # Solve 2 misses its deadline and is still running at the next measurement
+    assert setpoints == [('plan', None, 1.0), ('last_plan', 'deadline', 1.01), ('last_plan', 'pending', 1.02),
+                         ('plan', None, 3.0)]
+    summary = service.latency_summary()
+    assert summary['fallbacks'] == 2 and summary['deadline_misses'] == 2
+    assert summary['max_latency'] < interval
+
+
+def test_idle_before_the_first_plan_and_late_plan_is_adopted():
+    _, setpoints = run_service(4, replan_steps=2, delays={1: slow, 2: slow})
+    # The late first plan is adopted from the step it was started for, the late second one as well
+    assert setpoints == [('idle', 'deadline', 0.0), ('schedule', None, 1.01), ('last_plan', 'deadline', 1.02),
+                         ('schedule', None, 2.01)]
+
+
+def test_failed_solves_fall_back_to_the_last_plan():
+    service, setpoints = run_service(5, delays={3: slow}, failures=(2, 3))
+    assert setpoints == [('plan', None, 1.0), ('last_plan', 'error', 1.01), ('last_plan', 'deadline', 1.02),
+                         ('plan', None, 4.0), ('plan', None, 5.0)]
+    errors = [setpoint['error'] for setpoint in service.setpoints]
+    # The error of solve 3, which fails after its deadline, is reported with the next setpoint
+    assert errors == [None, "RuntimeError('solve 2 failed')", None, "RuntimeError('solve 3 failed')", None]
+    assert service.latency_summary()['errors'] == 2
+
+
+def test_bounded_history_keeps_the_totals():
+    service, setpoints = run_service(4, history_size=2, delays={2: 0.3})
+    assert setpoints == [('last_plan', 'pending', 1.02), ('plan', None, 3.0)]
+    summary = service.latency_summary()
+    assert summary['setpoints'] == 4 and summary['fallbacks'] == 2 and summary['deadline_misses'] == 2
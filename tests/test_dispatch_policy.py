@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from dispatch_policy import DispatchPolicy, RuleBasedPolicy, compare_policies, make_policy, policies
+from simulation import run_simulation
+from validation import validate_results
+
+
+def test_policies_implement_the_interface():
+    for cls in (DispatchPolicy, RuleBasedPolicy):
+        with pytest.raises(TypeError):
+            cls()
+    with pytest.raises(ValueError):
+        make_policy('unknown')
+
+
+@pytest.mark.parametrize('name', ['greedy', 'tou', 'no_battery'])
+def test_rule_based_policies_respect_the_limits(inputs, name):
+    results = make_policy(name).run(inputs, mode='mid_prod', use_battery=True, n_battery=2, n_hour=14 * 24)
+    report = validate_results(results, capacity=27.0)
+    assert report.ok, report.summary()
+
+
+def test_no_battery_policy_matches_mpc_without_battery(inputs):
+    results = make_policy('no_battery').run(inputs, mode='mid_prod', n_battery=2, n_hour=7 * 24)
+    expected = run_simulation(inputs, mode='mid_prod', use_battery=False, n_battery=2, n_hour=7 * 24, verbose=False)
+    np.testing.assert_allclose(results['income'], expected['income'], atol=1e-9)
+
+
+def test_compare_policies_reuses_results(inputs):
+    mpc = run_simulation(inputs, n_hour=7 * 24, verbose=False)
+    comparison = compare_policies(inputs, n_hour=7 * 24, results={'mpc': mpc}, cpu_seconds={'mpc': 1.0})
+    assert list(comparison.index) == list(policies)
+    assert comparison.loc['mpc', 'cpu_seconds'] == 1.0
+    assert comparison.loc['mpc', 'net_cost'] == -mpc['income'].sum()
+    assert comparison['cost_vs_mpc'].min() >= -1e-9
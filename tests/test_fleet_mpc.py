@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import linear_program
+from fleet_mpc import FleetMPC
+from simulation import load_inputs, make_battery
+from smart_grid_mpc import SmartGridMPC
+
+horizon = 24
+ampacity = 12
+n_batteries = (1, 2, 3)
+solar_scales = (0.5, 1.0, 1.5)
+
+
+@pytest.fixture(scope='module')
+def august():
+    """Hourly inputs of the first days of August 2024, where the export price beats the buy price at peak."""
+    return load_inputs(2 * horizon, start='2024-08-01')
+
+
+def fleet_forecast(forecast):
+    """Shared prices and one solar production and consumption row per home."""
+    buy_prices, sell_prices, solar_production, consumption = forecast
+    return (buy_prices, sell_prices, np.array([scale * solar_production for scale in solar_scales]),
+            np.tile(consumption, (len(solar_scales), 1)))
+
+
+def make_fleet(**kwargs):
+    batteries = [make_battery(n) for n in n_batteries]
+    for i, battery in enumerate(batteries):
+        battery.soc = battery.safe_level + 0.25 * i * (battery.capacity - battery.safe_level)
+    return FleetMPC(batteries, ampacity, horizon=horizon, **kwargs)
+
+
+def home_costs(fleet, forecast, battery_actions, grid_actions):
+    """Cost of every home of the fleet, and of the SmartGridMPC optimum of every home on its own."""
+    buy_prices, sell_prices, solar_production, consumption = forecast
+    fleet_costs = []
+    own_costs = []
+    for i, battery in enumerate(fleet.batteries):
+        controller = SmartGridMPC(battery, ampacity, horizon=horizon)
+        home_forecast = (buy_prices, sell_prices, solar_production[i], consumption[i])
+        fleet_costs.append(controller.objective_function(np.concatenate([battery_actions[i], grid_actions[i]]),
+                                                         *home_forecast))
+        own_costs.append(controller.objective_function(np.concatenate(controller.optimize(*home_forecast)),
+                                                       *home_forecast))
+    return np.array(fleet_costs), np.array(own_costs)
+
+
+@pytest.mark.parametrize('start', [0, 12])
+def test_uncoupled_fleet_matches_the_homes(window, start):
+    forecast = fleet_forecast(window(start, horizon))
+    fleet = make_fleet()
+    battery_actions, grid_actions = fleet.optimize(*forecast)
+    assert battery_actions.shape == grid_actions.shape == (len(n_batteries), horizon)
+
+    fleet_costs, own_costs = home_costs(fleet, forecast, battery_actions, grid_actions)
+    np.testing.assert_allclose(fleet_costs.sum(), own_costs.sum(), rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(fleet_costs, own_costs, rtol=1e-6, atol=1e-6)
+
+
+def test_feeder_ampacity_bounds_the_fleet_grid_power(window):
+    forecast = fleet_forecast(window(12, horizon))
+    _, uncoupled = make_fleet().optimize(*forecast)
+    feeder_ampacity = 0.5 * np.abs(uncoupled.sum(axis=0)).max()
+
+    fleet = make_fleet(feeder_ampacity=feeder_ampacity)
+    battery_actions, grid_actions = fleet.optimize(*forecast)
+    assert np.abs(grid_actions.sum(axis=0)).max() <= feeder_ampacity + 1e-6
+
+    # The coupling binds, so the fleet pays more than its homes on their own, and every home stays feasible
+    fleet_costs, own_costs = home_costs(fleet, forecast, battery_actions, grid_actions)
+    assert fleet_costs.sum() > own_costs.sum() + 1e-6
+    buy_prices, sell_prices, solar_production, consumption = forecast
+    for i, battery in enumerate(fleet.batteries):
+        controller = SmartGridMPC(battery, ampacity, horizon=horizon)
+        assert controller.max_constraint_violation(battery_actions[i], grid_actions[i], solar_production[i],
+                                                   consumption[i]) < 1e-6
+
+
+def test_august_arbitrage_hours_are_solved_as_milp(august, window, monkeypatch):
+    milp_calls = []
+
+    def milp(*args, **kwargs):
+        milp_calls.append(kwargs)
+        return real_milp(*args, **kwargs)
+
+    real_milp = linear_program.milp
+    monkeypatch.setattr(linear_program, 'milp', milp)
+
+    forecast = fleet_forecast(window(0, horizon, inputs=august))
+    buy_prices, sell_prices, _, _ = forecast
+    arbitrage = sell_prices > buy_prices
+    assert arbitrage.any()
+
+    fleet = make_fleet()
+    battery_actions, grid_actions = fleet.optimize(*forecast)
+    assert milp_calls
+    # Without the binary directions buying and selling in the same hour would be unbounded
+    assert np.isfinite(grid_actions).all() and (grid_actions[:, arbitrage] < 0).any()
+
+    fleet_costs, own_costs = home_costs(fleet, forecast, battery_actions, grid_actions)
+    np.testing.assert_allclose(fleet_costs, own_costs, rtol=1e-6, atol=1e-6)
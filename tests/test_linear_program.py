@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from battery_system import BatterySystem
+from simulation import make_battery
+from smart_grid_mpc import SmartGridMPC
+
+
+def solve(solver, forecast, horizon, **kwargs):
+    controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=horizon, solver=solver, use_battery=True,
+                              **kwargs)
+    battery_actions, grid_actions = controller.optimize(*forecast)
+    x = np.concatenate([battery_actions, grid_actions])
+    return controller, controller.objective_function(x, *forecast), controller.soc_trajectory(x)
+
+
+def test_linprog_matches_slsqp(window):
+    forecast = window(0, 48)
+    controller, lp_cost, lp_soc = solve('linprog', forecast, 48)
+    _, slsqp_cost, slsqp_soc = solve('slsqp', forecast, 48)
+
+    # The LP is the exact optimum, SLSQP a local one of the same problem
+    assert lp_cost <= slsqp_cost + 1e-6
+    assert slsqp_cost - lp_cost < 0.01 * abs(lp_cost)
+    # Both fill the battery to capacity and empty it to the safe level at the same points
+    battery = controller.battery
+    for soc in (lp_soc, slsqp_soc):
+        assert soc.min() >= battery.safe_level - 1e-6 and soc.max() <= battery.capacity + 1e-6
+    np.testing.assert_allclose(np.argmax(lp_soc), np.argmax(slsqp_soc))
+    np.testing.assert_allclose(lp_soc.max(), slsqp_soc.max(), atol=1e-3)
+    assert np.abs(lp_soc - slsqp_soc).mean() < 1.0
+
+
+def test_planned_soc_matches_battery_with_negative_prices():
+    # Negative prices pay for burning energy by charging and discharging in the same step
+    horizon = 24
+    battery = BatterySystem(capacity=27.0, max_charge_rate=13.5, max_discharge_rate=13.5)
+    controller = SmartGridMPC(battery, ampacity=12, horizon=horizon, use_battery=True)
+    forecast = (np.full(horizon, -0.1), np.full(horizon, -0.2), np.zeros(horizon), np.ones(horizon))
+    battery_actions, _ = controller.optimize(*forecast)
+
+    x, _ = controller._lp.solve(*forecast, battery.soc, 12, 12)
+    charge, discharge, soc = x[:horizon], x[horizon:2 * horizon], x[4 * horizon:]
+    assert np.minimum(charge, discharge).max() <= 1e-7
+
+    battery_socs = battery.apply(battery_actions)
+    np.testing.assert_allclose(np.append(battery_socs[1:], battery.soc), soc, atol=1e-6)
+
+
+def test_degradation_cost_lowers_throughput(window):
+    forecast = window(0, 48)
+    throughput = []
+    for degradation_cost in (0.0, 0.2):
+        controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=48, degradation_cost=degradation_cost)
+        battery_actions, _ = controller.optimize(*forecast)
+        throughput.append(np.abs(battery_actions).sum())
+    # Cycling costs more than the spread between the buy price and the export price of stored solar
+    assert throughput[1] < 0.5 * throughput[0]
+
+
+def test_terminal_soc_value_above_the_buy_price_fills_the_battery(window):
+    forecast = window(0, 48)
+    buy_prices = forecast[0]
+    battery = make_battery(2)
+    # A kWh left in the battery is worth more than buying it at the highest price and storing it
+    terminal_soc_value = 1.1 * buy_prices.max() / battery.efficiency
+    final_soc = [solve('linprog', forecast, 48, terminal_soc_value=value)[2][-1] for value in (0.0, terminal_soc_value)]
+    assert final_soc[1] > final_soc[0]
+    np.testing.assert_allclose(final_soc[1], battery.capacity, atol=1e-6)
+
+
+@pytest.mark.parametrize('degradation_cost, terminal_soc_value', [(0.2, 0.0), (0.0, 1.0), (0.02, 0.6)])
+def test_objectives_agree_with_degradation_and_terminal_value(window, degradation_cost, terminal_soc_value):
+    forecast = window(0, 48)
+    terms = {'degradation_cost': degradation_cost, 'terminal_soc_value': terminal_soc_value}
+    controller, lp_cost, _ = solve('linprog', forecast, 48, **terms)
+    _, slsqp_cost, _ = solve('slsqp', forecast, 48, **terms)
+
+    # The SLSQP objective of the LP optimum is the LP objective, and SLSQP finds no better point
+    _, result = controller._lp.solve(*forecast, controller.battery.soc, *controller.grid_limits(*forecast[2:]))
+    np.testing.assert_allclose(lp_cost, result.fun, rtol=1e-9, atol=1e-9)
+    assert lp_cost <= slsqp_cost + 1e-6
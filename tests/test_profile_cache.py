@@ -0,0 +1,33 @@
+import os
+import numpy as np
+import pytest
+import profile_cache
+from solar_simulator import SolarProductionSimulator
+from consumption_simulator import ConsumptionSimulator
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile_cache, 'cache_dir', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize('simulator', [SolarProductionSimulator, ConsumptionSimulator])
+def test_cached_profile_matches_fresh_load(cache_dir, simulator):
+    fresh = simulator(use_cache=False)
+    first = simulator(use_cache=True)  # miss, parses and writes the cache
+    cached = simulator(use_cache=True)  # hit, memory-maps the cache
+    assert len(os.listdir(cache_dir)) == 2
+    for other in (first, cached):
+        for name in ('mdh_valid', 'mdh_prod' if simulator is SolarProductionSimulator else 'mdh_consumption'):
+            np.testing.assert_array_equal(getattr(other, name), getattr(fresh, name))
+    assert isinstance(cached.mdh_valid, np.memmap)
+
+
+def test_cache_key_changes_with_source(tmp_path):
+    source = tmp_path / 'profile.csv'
+    source.write_text('a\n1\n')
+    key = profile_cache.cache_key(str(source))
+    assert profile_cache.cache_key(str(source), mode='base') != key
+    source.write_text('a\n12\n')
+    assert profile_cache.cache_key(str(source)) != key
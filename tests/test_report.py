@@ -0,0 +1,22 @@
+import pytest
+from report import capacity_from_path, render_reports
+from simulation import run_simulation
+
+
+def test_capacity_from_path():
+    assert capacity_from_path('data/output/mid_prod/mid_prod_27.0.csv') == 27.0
+    assert capacity_from_path('low_prod_0.csv') == 0.0
+    for path in ('data/output/sweep.csv', 'scenario_evaluation.csv', 'mid_prod_27.0_telemetry.csv'):
+        with pytest.raises(ValueError):
+            capacity_from_path(path)
+
+
+def test_render_reports_skips_other_csvs(tmp_path, inputs):
+    results = run_simulation(inputs, n_hour=2 * 24, verbose=False)
+    (tmp_path / 'base' / 'mid_prod').mkdir(parents=True)
+    results.to_csv(tmp_path / 'base' / 'mid_prod' / 'mid_prod_27.0.csv', index=False)
+    for name in ('sweep.csv', 'scenario_evaluation.csv', 'base/mid_prod/mid_prod_27.0_telemetry.csv'):
+        (tmp_path / name).write_text('a,b\n1,2\n')
+
+    paths = render_reports(str(tmp_path), output_dir=str(tmp_path / 'figure'), processes=1)
+    assert paths == [str(tmp_path / 'figure' / 'base' / 'mid_prod' / 'mid_prod_27.0.png')]
@@ -0,0 +1,37 @@
+import builtins
+import pandas as pd
+import pytest
+import result_store
+from simulation import run_simulation
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_round_trip(tmp_path, inputs, format):
+    pytest.importorskip('pyarrow')
+    results = run_simulation(inputs, n_hour=14 * 24, verbose=False)
+    result_store.write_results(results, str(tmp_path), 'mid_prod', 27.0, 'base', format=format)
+    assert result_store.list_partitions(str(tmp_path)) == [('mid_prod', 27.0, 'base')]
+
+    read = result_store.read_results(str(tmp_path), 'mid_prod', 27.0, 'base')
+    pd.testing.assert_frame_equal(read, results, check_freq=False, check_dtype=False)
+    week = result_store.read_results(str(tmp_path), 'mid_prod', 27.0, 'base', columns=['income'],
+                                     start='2024-01-03', n_day=7)
+    expected = results[(results['time'] >= '2024-01-03') & (results['time'] < '2024-01-10')]
+    assert list(week.columns) == ['income'] and len(week) == 7 * 24
+    assert week['income'].tolist() == expected['income'].tolist()
+
+
+def test_resolve_format_falls_back_to_csv(monkeypatch, capsys):
+    import_module = builtins.__import__
+
+    def no_pyarrow(name, *args, **kwargs):
+        if name == 'pyarrow':
+            raise ImportError(name)
+        return import_module(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, '__import__', no_pyarrow)
+    assert result_store.resolve_format('csv') == 'csv'
+    assert result_store.resolve_format('parquet') == 'csv'
+    assert 'pyarrow is not installed' in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        result_store.resolve_format('xlsx')
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+import numpy as np
+import scenario_mpc
+from scenario_mpc import ScenarioMPC
+from simulation import make_battery
+from smart_grid_mpc import SmartGridMPC
+
+horizon = 24
+shared_steps = 4
+
+
+def test_scenarios_share_the_first_actions_and_stay_feasible(window, monkeypatch):
+    solutions = []
+
+    def solve_lp(*args, **kwargs):
+        x, result = real_solve_lp(*args, **kwargs)
+        solutions.append(x)
+        return x, result
+
+    real_solve_lp = scenario_mpc.solve_lp
+    monkeypatch.setattr(scenario_mpc, 'solve_lp', solve_lp)
+
+    controller = ScenarioMPC(make_battery(2), ampacity=12, horizon=horizon, n_scenario=5, shared_steps=shared_steps,
+                             seed=0)
+    battery_actions, _ = controller.optimize(*window(12, horizon))
+    x = solutions[-1].reshape(controller.n_scenario, -1)
+
+    # Charge and discharge of the shared steps are equal in all scenarios, the recourse differs
+    for shared in (slice(0, shared_steps), slice(horizon, horizon + shared_steps)):
+        np.testing.assert_allclose(x[:, shared], np.tile(x[0, shared], (controller.n_scenario, 1)), atol=1e-7)
+    assert not np.allclose(x[:, 2 * horizon:3 * horizon], x[0, 2 * horizon:3 * horizon])
+    np.testing.assert_allclose(battery_actions, x[0, :horizon] - x[0, horizon:2 * horizon])
+
+    # Every scenario meets its own power balance, SOC dynamics and bounds
+    for lp, x_scenario in zip(controller.scenarios, x):
+        np.testing.assert_allclose(lp.A_eq @ x_scenario, lp.b_eq, atol=1e-6)
+        assert (x_scenario >= lp.bounds[:, 0] - 1e-7).all() and (x_scenario <= lp.bounds[:, 1] + 1e-7).all()
+
+    assert controller.telemetry[-1]['fallback'] is False
+    assert controller.telemetry_summary()['fallbacks'] == 0
+
+
+def test_failed_scenario_solve_falls_back_to_the_forecast(window, monkeypatch, capsys):
+    monkeypatch.setattr(scenario_mpc, 'solve_lp', lambda *args, **kwargs: (None, SimpleNamespace(message='infeasible')))
+    forecast = window(12, horizon)
+    controller = ScenarioMPC(make_battery(2), ampacity=12, horizon=horizon, n_scenario=5, shared_steps=shared_steps,
+                             seed=0)
+    battery_actions, grid_actions = controller.optimize(*forecast)
+
+    assert 'Scenario optimization failed: infeasible' in capsys.readouterr().out
+    assert controller.telemetry[-1]['fallback'] is True and controller.telemetry[-1]['success']
+    assert controller.telemetry_summary()['fallbacks'] == 1
+    deterministic = SmartGridMPC(make_battery(2), ampacity=12, horizon=horizon)
+    np.testing.assert_allclose(battery_actions, deterministic.optimize(*forecast)[0], atol=1e-6)
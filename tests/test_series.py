@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from price_forecast import PriceForecast
+from solar_simulator import SolarProductionSimulator
+from consumption_simulator import ConsumptionSimulator
+
+# A leap year, so that Feb 29 takes the fallback to Feb 28
+times = pd.date_range('2024-01-01', '2024-12-31 23:00', freq='h')
+
+
+@pytest.mark.parametrize('simulator', [SolarProductionSimulator, ConsumptionSimulator])
+def test_series_matches_simulate(simulator):
+    simulator = simulator()
+    expected = [simulator.simulate(t.month, t.day, t.hour) for t in times]
+    np.testing.assert_array_equal(simulator.series(times), expected)
+
+
+def test_price_series_matches_lookups():
+    price_forecast = PriceForecast()
+    buy_prices, sell_prices = price_forecast.series(times)
+    np.testing.assert_array_equal(buy_prices, [price_forecast.get_buy_price(t.year, t.month, t.day, t.hour)
+                                               for t in times])
+    np.testing.assert_array_equal(sell_prices, [price_forecast.get_sell_price(t.month, t.hour) for t in times])
+
+
+def test_sub_hourly_series_interpolates():
+    simulator = SolarProductionSimulator()
+    quarter_hours = pd.date_range('2024-06-01', periods=4 * 24, freq='15min')
+    values = simulator.series(quarter_hours)
+    np.testing.assert_array_equal(values[::4], simulator.series(quarter_hours[::4]))
+    np.testing.assert_allclose(values[2:-4:4], (values[0:-4:4] + values[4::4]) / 2)
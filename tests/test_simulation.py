@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import Config
+from simulation import load_inputs, make_battery, production_adjust, run_simulation, steps_per_hour
+from smart_grid_mpc import SmartGridMPC
+from validation import validate_results
+
+
+def reference_simulation(inputs, n_hour, horizon=24, delta_hour=24, mode='mid_prod'):
+    """The row-by-row simulation loop of the original main.py."""
+    battery = make_battery(2)
+    controller = SmartGridMPC(battery, ampacity=12, horizon=horizon, warm_start=True, delta_hour=delta_hour,
+                              use_battery=True)
+    times = inputs['times']
+    buy_prices, sell_prices = inputs['buy_prices'], inputs['sell_prices']
+    solar_production = inputs['solar_production'] * production_adjust(mode)
+    consumption = inputs['consumption']
+    results = pd.DataFrame({
+        'time': times[:n_hour],
+        'buy_price': buy_prices[:n_hour],
+        'sell_price': sell_prices[:n_hour],
+        'solar_production': solar_production[:n_hour],
+        'consumption': consumption[:n_hour],
+        'battery_action': np.nan,
+        'grid_action': np.nan,
+        'battery_soc': np.nan,
+        'buying_cost': np.nan,
+        'selling_revenue': np.nan
+    })
+    for t in range(0, n_hour, delta_hour):
+        battery_action, grid_action = controller.optimize(buy_prices[t:t + horizon], sell_prices[t:t + horizon],
+                                                          solar_production[t:t + horizon],
+                                                          consumption[t:t + horizon])
+        for i in range(min(delta_hour, n_hour - t)):
+            ti = t + i
+            results.loc[ti, 'battery_action'] = battery_action[i]
+            results.loc[ti, 'grid_action'] = grid_action[i]
+            results.loc[ti, 'battery_soc'] = battery.soc
+            if grid_action[i] > 0:  # Buy
+                results.loc[ti, 'buying_cost'] = grid_action[i] * buy_prices[ti]
+                results.loc[ti, 'selling_revenue'] = 0
+            else:  # Sell
+                results.loc[ti, 'buying_cost'] = 0
+                results.loc[ti, 'selling_revenue'] = -grid_action[i] * sell_prices[ti]
+            if battery_action[i] > 0:  # Charging
+                battery.soc += battery_action[i] * battery.efficiency
+            else:  # Discharging
+                battery.soc += battery_action[i] / battery.efficiency
+            battery.soc = np.clip(battery.soc, 0, battery.capacity)
+
+    results['income'] = results['selling_revenue'] - results['buying_cost']
+    results['cum_income'] = results['income'].cumsum()
+    results['consumption_cost'] = results['consumption'] * results['buy_price']
+    results['cum_consumption_cost'] = results['consumption_cost'].cumsum()
+    results['cum_solar_earn'] = results['cum_consumption_cost'] + results['cum_income']
+    return results
+
+
+def test_recorded_results_match_row_by_row_loop(inputs):
+    n_hour = 14 * 24
+    results = run_simulation(inputs, mode='mid_prod', use_battery=True, n_battery=2, n_hour=n_hour, horizon=24,
+                             verbose=False)
+    expected = reference_simulation(inputs, n_hour)
+    pd.testing.assert_frame_equal(results, expected, check_freq=False, rtol=1e-12, atol=1e-12)
+
+
+def test_time_step_must_divide_the_hour():
+    assert [steps_per_hour(minutes / 60) for minutes in (60, 30, 15, 5)] == [1, 2, 4, 12]
+    times = load_inputs(2, dt=15 / 60)['times']
+    assert len(times) == 8 and (times[1] - times[0]) == pd.Timedelta(minutes=15)
+    for minutes in (7, 45, 90):
+        with pytest.raises(ValueError):
+            steps_per_hour(minutes / 60)
+        with pytest.raises(ValueError):
+            Config(step_minutes=minutes)
+
+
+def test_scenario_mpc_runs_are_reproducible(inputs):
+    runs = [run_simulation(inputs, n_hour=3 * 24, verbose=False, n_scenario=4, seed=seed) for seed in (0, 0, 1)]
+    pd.testing.assert_frame_equal(runs[0], runs[1])
+    assert not runs[0]['battery_action'].equals(runs[2]['battery_action'])
+
+
+def test_config_reaches_the_simulation(inputs):
+    cfg = Config(c_rate=0.1)
+    results = run_simulation(inputs, cfg, n_hour=3 * 24, verbose=False)
+    assert results['battery_action'].abs().max() <= cfg.capacity * cfg.c_rate + 1e-9
+    assert not run_simulation(inputs, n_hour=3 * 24, verbose=False)['battery_action'].equals(results['battery_action'])
+    assert validate_results(results, cfg).ok
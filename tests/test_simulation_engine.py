@@ -0,0 +1,56 @@
+import itertools
+import pandas as pd
+import pytest
+from simulation import make_battery
+from smart_grid_mpc import SmartGridMPC
+from simulation_engine import SimulationEngine, CSVSink, ParquetSink, stream_inputs
+
+n_hour = 5 * 24
+
+
+def make_engine(path, sink=CSVSink):
+    battery = make_battery(2)
+    controller = SmartGridMPC(battery, ampacity=12, horizon=24, warm_start=True, delta_hour=24, use_battery=True)
+    return SimulationEngine(controller, battery, sink=sink(str(path)), checkpoint_path=f'{path}.checkpoint.json')
+
+
+def run(engine, position=0, steps=None):
+    start = pd.Timestamp('2024-01-01') + pd.Timedelta(hours=position)
+    stream = stream_inputs(start, n_hour - position + 24, mode='mid_prod', consumption_mode='base')
+    for _ in itertools.islice(engine.run(stream, n_hour=n_hour), steps):
+        pass
+
+
+@pytest.mark.parametrize('sink, read', [(CSVSink, pd.read_csv), (ParquetSink, pd.read_parquet)])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, sink, read):
+    if sink is ParquetSink:
+        pytest.importorskip('pyarrow')
+    suffix = 'csv' if sink is CSVSink else 'parquet'
+    run(make_engine(tmp_path / f'full.{suffix}', sink))
+
+    # Interrupt after two MPC steps, then resume in a new engine from the checkpoint
+    run(make_engine(tmp_path / f'resumed.{suffix}', sink), steps=2)
+    engine = make_engine(tmp_path / f'resumed.{suffix}', sink)
+    position = engine.resume()
+    assert position == 48
+    run(engine, position=position)
+
+    full = read(tmp_path / f'full.{suffix}')
+    resumed = read(tmp_path / f'resumed.{suffix}')
+    assert len(full) == n_hour
+    pd.testing.assert_frame_equal(resumed, full)
+
+
+def test_resume_without_offset_fails(tmp_path):
+    for sink in (CSVSink(str(tmp_path / 'out.csv')), ParquetSink(str(tmp_path / 'out.parquet'))):
+        with pytest.raises(ValueError):
+            sink.open(None, resuming=True)
+
+
+def test_engine_matches_run_simulation(tmp_path, inputs):
+    from simulation import run_simulation
+
+    run(make_engine(tmp_path / 'engine.csv'))
+    engine = pd.read_csv(tmp_path / 'engine.csv', parse_dates=['time'])
+    results = run_simulation(inputs, n_hour=n_hour, verbose=False)
+    pd.testing.assert_frame_equal(engine, results, check_freq=False, check_dtype=False, rtol=1e-9, atol=1e-9)
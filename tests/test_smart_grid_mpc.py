@@ -0,0 +1,45 @@
+import numpy as np
+from scipy.optimize import check_grad
+from simulation import make_battery
+from smart_grid_mpc import SmartGridMPC
+
+
+def test_vectorized_slsqp_matches_closures(window):
+    forecast = window(24, 24)
+    solutions = []
+    for vectorized in (False, True):
+        controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=24, solver='slsqp', vectorized=vectorized,
+                                  use_battery=True)
+        battery_actions, grid_actions = controller.optimize(*forecast)
+        x = np.concatenate([battery_actions, grid_actions])
+        solutions.append((controller.objective_function(x, *forecast), controller.soc_trajectory(x)))
+
+    (loop_cost, loop_soc), (vectorized_cost, vectorized_soc) = solutions
+    np.testing.assert_allclose(vectorized_cost, loop_cost, rtol=1e-3)
+    np.testing.assert_allclose(vectorized_soc, loop_soc, atol=0.05)
+
+
+def test_vectorized_constraints_match_closures(window):
+    buy_prices, sell_prices, solar_production, consumption = window(0, 24)
+    controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=24, solver='slsqp', use_battery=True)
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.uniform(-10, 10, 24), rng.uniform(-12, 12, 24)])
+
+    closures = controller.constraints(x, solar_production, consumption)
+    soc_min, soc_max, balance = controller.vectorized_constraints(solar_production, consumption)
+    np.testing.assert_allclose(soc_min['fun'](x), [c['fun'](x) for c in closures[0::3]])
+    np.testing.assert_allclose(soc_max['fun'](x), [c['fun'](x) for c in closures[1::3]])
+    np.testing.assert_allclose(balance['fun'](x), [c['fun'](x) for c in closures[2::3]])
+
+
+def test_analytic_jacobians(window):
+    forecast = window(0, 24)
+    controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=24, solver='slsqp', use_battery=True,
+                              degradation_cost=0.02, terminal_soc_value=0.1)
+    rng = np.random.default_rng(1)
+    x = np.concatenate([rng.uniform(-10, 10, 24), rng.uniform(-12, 12, 24)])
+
+    assert check_grad(controller.objective_function, controller.objective_gradient, x, *forecast) < 1e-5
+    soc_min = controller.vectorized_constraints(forecast[2], forecast[3])[0]
+    for i in range(24):
+        assert check_grad(lambda x: soc_min['fun'](x)[i], lambda x: soc_min['jac'](x)[i], x) < 1e-5
@@ -0,0 +1,46 @@
+import numpy as np
+from simulation import make_battery, run_simulation
+from smart_grid_mpc import SmartGridMPC
+from solution_cache import SolutionCache
+
+
+def test_cache_hit_returns_solution_and_status(window):
+    cache = SolutionCache()
+    controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=24, use_battery=True, cache=cache)
+    solved = controller.optimize(*window())
+    cached = controller.optimize(*window())
+    np.testing.assert_array_equal(cached[0], solved[0])
+    np.testing.assert_array_equal(cached[1], solved[1])
+    assert cache.info()['hits'] == 1
+    assert [(record['cache_hit'], record['status'], record['success']) for record in controller.telemetry] == \
+        [(False, 0, True), (True, 0, True)]
+
+
+def test_failed_solve_is_not_cached(window):
+    cache = SolutionCache()
+    controller = SmartGridMPC(make_battery(2), ampacity=12, horizon=24, use_battery=True, cache=cache)
+    buy_prices, sell_prices, solar_production, consumption = window()
+    # More consumption than the grid and the battery can supply
+    infeasible = (buy_prices, sell_prices, solar_production, consumption + 50)
+    for _ in range(2):
+        controller.optimize(*infeasible)
+    assert len(cache) == 0 and cache.hits == 0
+    assert controller.telemetry_summary()['failures'] == 2
+
+
+def test_no_battery_key_ignores_battery(window):
+    cache = SolutionCache()
+    keys = set()
+    for n_battery in (0, 1, 2):
+        controller = SmartGridMPC(make_battery(n_battery), ampacity=12, horizon=24, use_battery=False)
+        keys.add(cache.key(controller, *window()))
+    assert len(keys) == 1
+
+
+def test_cached_run_matches_uncached_run(inputs):
+    cache = SolutionCache()
+    uncached = run_simulation(inputs, n_hour=10 * 24, verbose=False)
+    run_simulation(inputs, n_hour=10 * 24, cache=cache, verbose=False)
+    cached = run_simulation(inputs, n_hour=10 * 24, cache=cache, verbose=False)
+    assert cache.hits == 10
+    np.testing.assert_array_equal(cached['battery_action'], uncached['battery_action'])
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from simulation import run_simulation
+from sweep import make_grid, run_sweep
+from config import Config
+
+
+def test_make_grid_runs_no_battery_once():
+    configs = make_grid(modes=('low_prod', 'mid_prod'), use_batteries=(0, 1), n_batteries=(1, 2, 3))
+    assert len(configs) == 2 * (1 + 3)
+    no_battery = [run_config for run_config in configs if not run_config['use_battery']]
+    assert [run_config['mode'] for run_config in no_battery] == ['low_prod', 'mid_prod']
+    assert all(run_config['n_battery'] == 0 for run_config in no_battery)
+
+
+def test_no_battery_results_do_not_depend_on_n_battery(inputs):
+    results = [run_simulation(inputs, use_battery=False, n_battery=n_battery, n_hour=7 * 24, verbose=False)
+               for n_battery in (0, 2)]
+    # The SOC of the idle battery is its initial SOC, every flow and cost is the same
+    pd.testing.assert_frame_equal(*(r.drop(columns='battery_soc') for r in results))
+
+
+def test_run_sweep_follows_the_config():
+    configs = make_grid(n_batteries=(1, 2))
+    summary = run_sweep(configs, Config(n_day=2, c_rate=0.25), processes=1)
+    assert list(summary['capacity']) == [13.5, 27.0]
+    assert summary['valid'].all()
+
+
+def test_sub_hourly_summary_is_in_kwh():
+    hourly, quarter_hourly = (run_sweep(make_grid(), Config(n_day=2, step_minutes=minutes), processes=1)
+                              for minutes in (60, 15))
+    for column in ('total_production', 'total_consumption'):
+        np.testing.assert_allclose(quarter_hourly[column], hourly[column], rtol=0.01)
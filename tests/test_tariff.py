@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import pandas as pd
+from dispatch_policy import make_policy
+from tariff import Tariff, default_tariff
+
+times = pd.date_range('2024-01-01', '2024-12-31 23:00', freq='h')
+
+
+def fixed_buy_price(time):
+    """Buy price of the hard-coded weekday/weekend schedule that the tariff file replaced."""
+    if time.dayofweek < 5:
+        rates = {'Super Off-Peak': 0.376, 'Off-Peak': 0.394, 'On-Peak': 0.456}
+        changes = [(0, 'Super Off-Peak'), (6, 'Off-Peak'), (10, 'Super Off-Peak'), (14, 'Off-Peak'), (16, 'On-Peak'),
+                   (21, 'Off-Peak')]
+    else:
+        rates = {'Super Off-Peak': 0.481, 'Off-Peak': 0.499, 'On-Peak': 0.561}
+        changes = [(0, 'Super Off-Peak'), (14, 'Off-Peak'), (16, 'On-Peak'), (21, 'Off-Peak')]
+    return rates[[period for start_hour, period in changes if time.hour >= start_hour][-1]]
+
+
+def test_default_tariff_matches_fixed_schedule_except_holidays():
+    tariff = Tariff.from_file()
+    buy_prices, _ = tariff.prices(times)
+    expected = np.array([fixed_buy_price(t) for t in times])
+    holidays = np.asarray(times.normalize().isin(tariff.holiday_calendar.holidays(times.min(), times.max())))
+    assert holidays.sum() == 8 * 24
+    np.testing.assert_array_equal(buy_prices[~holidays], expected[~holidays])
+    # Holidays take the weekend rates
+    saturday = pd.date_range('2024-01-06', periods=24, freq='h')
+    weekend = np.array([fixed_buy_price(t) for t in saturday])
+    np.testing.assert_array_equal(buy_prices[holidays].reshape(-1, 24), np.tile(weekend, (8, 1)))
+
+
+def test_tariff_keeps_the_definition():
+    with open(default_tariff) as f:
+        definition = json.load(f)
+    Tariff(definition)
+    assert 'holiday' not in definition['periods']
+
+
+def test_tou_policy_uses_the_tariff_file(tmp_path):
+    with open(default_tariff) as f:
+        definition = json.load(f)
+    definition['periods']['weekday'] = [[0, 'On-Peak'], [1, 'Super Off-Peak']]
+    definition['holidays']['rules'] = []
+    path = tmp_path / 'tariff.json'
+    path.write_text(json.dumps(definition))
+
+    policy = make_policy('tou', tariff_file=str(path))
+    periods = policy.price_forecast.periods(pd.date_range('2024-01-02', periods=24, freq='h'))
+    assert periods[0] == 'On-Peak' and (periods[1:] == 'Super Off-Peak').all()
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from simulation import make_battery, production_adjust, run_simulation
+from smart_grid_mpc import SmartGridMPC
+
+
+def test_telemetry_does_not_change_results(inputs):
+    plain = run_simulation(inputs, n_hour=7 * 24, verbose=False)
+    results, telemetry, summary = run_simulation(inputs, n_hour=7 * 24, verbose=False, return_telemetry=True)
+    pd.testing.assert_frame_equal(results, plain)
+
+    assert len(telemetry) == summary['solves'] == 7
+    assert telemetry['time'].tolist() == list(inputs['times'][0:7 * 24:24])
+    assert summary['failures'] == 0 and summary['cache_hits'] == 0
+    assert summary['max_violation'] < 1e-6
+    np.testing.assert_allclose(summary['total_wall_time'], telemetry['wall_time'].sum())
+    np.testing.assert_allclose(summary['max_wall_time'], telemetry['wall_time'].max())
+
+
+def test_bounded_telemetry_keeps_the_totals(inputs):
+    adjust = production_adjust('mid_prod')
+    controllers = [SmartGridMPC(make_battery(2), ampacity=12, horizon=24, telemetry_size=size) for size in (None, 3)]
+    for start in range(0, 7 * 24, 24):
+        window = slice(start, start + 24)
+        for controller in controllers:
+            controller.optimize(inputs['buy_prices'][window], inputs['sell_prices'][window],
+                                inputs['solar_production'][window] * adjust, inputs['consumption'][window])
+
+    unbounded, bounded = controllers
+    assert len(unbounded.telemetry) == 7 and len(bounded.telemetry) == 3
+    summary, bounded_summary = unbounded.telemetry_summary(), bounded.telemetry_summary()
+    for key in ('solves', 'failures', 'cache_hits', 'mean_iterations', 'max_violation'):
+        assert bounded_summary[key] == summary[key]
+    assert bounded_summary['total_wall_time'] > sum(record['wall_time'] for record in bounded.telemetry)
@@ -0,0 +1,54 @@
+import numpy as np
+from simulation import run_simulation
+from validation import validate, validate_results
+
+
+def loop_violations(arr, efficiency):
+    """Balance and charge checks of the original main.py, as violating row indices."""
+    balance, dynamics = [], []
+    for i in range(arr.shape[0]):
+        p, c, charge, buy, soc1 = arr[i]
+        if not abs((c + charge) - (p + buy)) < 1e-6:
+            balance.append(i)
+        if i < arr.shape[0] - 1:
+            soc = arr[i + 1, 4]
+            if charge > 0:
+                if not abs(soc - soc1 - charge * efficiency) < 1e-6:
+                    dynamics.append(i)
+            else:
+                if not abs(soc - soc1 - charge / efficiency) < 1e-6:
+                    dynamics.append(i)
+    return balance, dynamics
+
+
+def test_validate_matches_loop(inputs):
+    results = run_simulation(inputs, n_hour=7 * 24, verbose=False)
+    rng = np.random.default_rng(0)
+    # Break the balance and the SOC dynamics at a few random hours
+    rows = rng.choice(len(results), 10, replace=False)
+    results.loc[rows[:5], 'grid_action'] += 0.5
+    results.loc[rows[5:], 'battery_soc'] += 0.3
+
+    report = validate_results(results, capacity=27.0)
+    columns = ['solar_production', 'consumption', 'battery_action', 'grid_action', 'battery_soc']
+    balance, dynamics = loop_violations(results[columns].values, 0.95)
+    assert report.violating_hours('balance')[0].tolist() == balance
+    assert report.violating_hours('soc_dynamics')[0].tolist() == dynamics
+    assert report.count('balance') == 5 and not report.ok
+
+
+def test_validate_fleet_matches_per_home(inputs):
+    homes = [run_simulation(inputs, n_battery=n_battery, n_hour=3 * 24, verbose=False) for n_battery in (1, 2)]
+    homes[1].loc[5, 'battery_soc'] = 30.0  # above capacity
+
+    def series(column):
+        return np.stack([home[column].values for home in homes])
+
+    capacity = np.array([[13.5], [27.0]])
+    fleet = validate(series('solar_production'), series('consumption'), series('battery_action'),
+                     series('grid_action'), series('battery_soc'), 0.95, 0.2 * capacity, capacity, 12)
+    for i, home in enumerate(homes):
+        report = validate_results(home, capacity=capacity[i, 0])
+        for check in report.violations:
+            np.testing.assert_array_equal(fleet.violations[check][i], report.violations[check])
+    assert fleet.worst('soc_bounds')[0] == (1, 5)
@@ -0,0 +1,106 @@
+import numpy as np
+from config import Config
+
+
+class ValidationReport:
+    """Violations of each physical check, with the location and size of the worst residual."""
+
+    def __init__(self, residuals, violations, times=None):
+        self.residuals = residuals  # check name -> residual array, 0 where the check holds exactly
+        self.violations = violations  # check name -> boolean array of violating hours
+        self.times = times
+
+    @property
+    def ok(self):
+        return not any(mask.any() for mask in self.violations.values())
+
+    def count(self, check):
+        return int(self.violations[check].sum())
+
+    def worst(self, check):
+        """Index and residual of the largest violation of a check, None if the check holds."""
+        if not self.violations[check].any():
+            return None
+        residual = np.where(self.violations[check], np.abs(self.residuals[check]), -np.inf)
+        index = tuple(int(i) for i in np.unravel_index(np.argmax(residual), residual.shape))
+        if len(index) == 1:
+            index = index[0]
+        return index, self.residuals[check][index]
+
+    def violating_hours(self, check):
+        """Indices of the violating hours, as returned by np.nonzero."""
+        return np.nonzero(self.violations[check])
+
+    def summary(self):
+        lines = []
+        for check in self.violations:
+            worst = self.worst(check)
+            if worst is None:
+                lines.append(f'{check}: ok')
+                continue
+            index, residual = worst
+            where = self.times[index] if self.times is not None else index
+            lines.append(f'{check}: {self.count(check)} violations, worst {residual:.3g} at {where}')
+        return '\n'.join(lines)
+
+
+def validate(solar_production, consumption, battery_action, grid_action, battery_soc, efficiency, safe_level,
+             capacity, ampacity, tol=1e-6, times=None, dt=1.0):
+    """
+    Check a simulated trajectory for power balance, SOC dynamics, SOC bounds and grid bounds.
+
+    The series have time on the last axis, so a (N, T) fleet is checked at once. The battery parameters
+    are scalars or broadcast against the series, e.g. (N, 1) arrays for per-home batteries.
+
+    Returns:
+        ValidationReport
+    """
+    solar_production, consumption, battery_action, grid_action, battery_soc = (
+        np.asarray(a, dtype=float) for a in (solar_production, consumption, battery_action, grid_action, battery_soc))
+
+    # Power balance: consumption + charge = production + buy
+    balance = (consumption + battery_action) - (solar_production + grid_action)
+
+    # SOC dynamics: charging stores action * efficiency, discharging draws action / efficiency
+    energy = np.where(battery_action > 0, battery_action * efficiency, battery_action / efficiency) * dt
+    dynamics = np.zeros_like(battery_soc)
+    dynamics[..., :-1] = np.diff(battery_soc, axis=-1) - energy[..., :-1]
+
+    # SOC bounds: safe_level <= SOC <= capacity
+    soc_bounds = np.minimum(battery_soc - safe_level, 0) + np.maximum(battery_soc - capacity, 0)
+
+    # Grid bounds: -ampacity <= grid action <= ampacity
+    grid_bounds = np.sign(grid_action) * np.maximum(np.abs(grid_action) - ampacity, 0)
+
+    residuals = {
+        'balance': balance,
+        'soc_dynamics': dynamics,
+        'soc_bounds': soc_bounds,
+        'grid_bounds': grid_bounds,
+    }
+    violations = {check: ~(np.abs(residual) <= tol) for check, residual in residuals.items()}
+    return ValidationReport(residuals, violations, times=times)
+
+
+def validate_results(results, cfg=None, capacity=None, tol=1e-6, dt=None):
+    """
+    Check a results DataFrame of the simulation against the battery and grid limits of cfg (default Config()).
+
+    capacity and dt default to cfg.capacity and cfg.dt.
+    """
+    cfg = cfg or Config()
+    capacity = cfg.capacity if capacity is None else capacity
+    return validate(
+        results['solar_production'].values,
+        results['consumption'].values,
+        results['battery_action'].values,
+        results['grid_action'].values,
+        results['battery_soc'].values,
+        cfg.efficiency,
+        capacity * cfg.min_battery_level,
+        capacity,
+        cfg.ampacity,
+        tol=tol,
+        times=results['time'].values if 'time' in results else None,
+        dt=cfg.dt if dt is None else dt,
+    )